@@ -156,6 +156,11 @@ async def shutdown_handler(bot: BallsDexBot, signal_type: str | None = None):
     try:
         await asyncio.wait_for(bot.close(), timeout=10)
     finally:
+        # the database is still open, write the caught countryballs before anything is cancelled
+        try:
+            await asyncio.wait_for(bot.catch_queue.stop(), timeout=10)
+        except asyncio.TimeoutError:
+            log.error("Timed out writing the caught countryballs!")
         pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
         [task.cancel() for task in pending]
         try:
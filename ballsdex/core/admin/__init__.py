@@ -25,11 +25,16 @@ from tortoise.contrib.fastapi import register_tortoise
 from ballsdex.__main__ import TORTOISE_ORM
 from ballsdex.core.admin import resources, routes  # noqa: F401
 from ballsdex.core.admin.resources import User
+from ballsdex.settings import read_settings
 
 BASE_DIR = pathlib.Path(".")
 
 
 def init_fastapi_app() -> FastAPI:
+    # the card previews are encoded like the bot does
+    if (config_file := BASE_DIR / "config.yml").exists():
+        read_settings(config_file)
+
     app = FastAPI()
     app.mount(
         "/static",
@@ -7,7 +7,13 @@ from fastapi_admin.file_upload import FileUpload
 from fastapi_admin.resources import Action, Field, Link, Model
 from fastapi_admin.widgets import displays, filters, inputs
 from starlette.requests import Request
+from tortoise.signals import Signals
 
+from ballsdex.core.inventory import (
+    drop_deleted_owned_balls,
+    drop_owned_balls,
+    drop_previous_owned_balls,
+)
 from ballsdex.core.models import (
     Ball,
     BallInstance,
@@ -283,6 +289,12 @@ class BallInstanceResource(Model):
     ]
 
 
+# the panel changes the instances without updating the bitmaps of owned countryballs
+BallInstance.register_listener(Signals.pre_save, drop_previous_owned_balls)
+BallInstance.register_listener(Signals.post_save, drop_owned_balls)
+BallInstance.register_listener(Signals.post_delete, drop_deleted_owned_balls)
+
+
 @app.register
 class PlayerResource(Model):
     label = "Player"
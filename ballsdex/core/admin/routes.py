@@ -2,11 +2,14 @@ from fastapi import Depends, Path
 from fastapi_admin.app import app
 from fastapi_admin.depends import get_current_admin, get_resources
 from fastapi_admin.template import templates
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 from starlette.responses import RedirectResponse, Response
 from tortoise.exceptions import DoesNotExist
 
+from ballsdex.core.image_generator.image_gen import CardEncoding
 from ballsdex.core.models import Ball, BallInstance, GuildConfig, Player, Special
+from ballsdex.settings import settings
 
 
 @app.get("/")
@@ -38,8 +41,10 @@ async def generate_card(
 ):
     ball = await Ball.get(pk=pk).prefetch_related("regime", "economy")
     temp_instance = BallInstance(ball=ball, player=await Player.first(), count=1)
-    buffer = temp_instance.draw_card()
-    return Response(content=buffer.read(), media_type="image/png")
+    encoding = CardEncoding.from_settings(settings)
+    # uploads may replace a file under the same name, the cached renders would be outdated
+    buffer = await run_in_threadpool(temp_instance.draw_card, encoding, cached=False)
+    return Response(content=buffer.read(), media_type=encoding.media_type)
 
 
 @app.get("/special/generate/{pk}", dependencies=[Depends(get_current_admin)])
@@ -55,5 +60,7 @@ async def generate_special_card(
             content="At least one ball must exist", status_code=422, media_type="text/html"
         )
     temp_instance = BallInstance(ball=ball, special=special, player=await Player.first(), count=1)
-    buffer = temp_instance.draw_card()
-    return Response(content=buffer.read(), media_type="image/png")
+    encoding = CardEncoding.from_settings(settings)
+    # uploads may replace a file under the same name, the cached renders would be outdated
+    buffer = await run_in_threadpool(temp_instance.draw_card, encoding, cached=False)
+    return Response(content=buffer.read(), media_type=encoding.media_type)
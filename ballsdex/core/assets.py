@@ -0,0 +1,164 @@
+import logging
+import threading
+from typing import TYPE_CHECKING, Iterable
+
+from cachetools import LRUCache
+from PIL import Image
+from prometheus_client import Counter, Gauge
+
+if TYPE_CHECKING:
+    from ballsdex.core.models import Ball, Economy, Regime, Special
+
+log = logging.getLogger("ballsdex.core.assets")
+asset_lookups = Counter("asset_store", "Asset store lookups", ["kind", "result"])
+asset_memory = Gauge("asset_store_bytes", "Memory used by the asset store")
+
+Asset = bytes | Image.Image
+
+
+def _asset_size(asset: Asset) -> int:
+    if isinstance(asset, bytes):
+        return len(asset)
+    return asset.width * asset.height * len(asset.getbands())
+
+
+class AssetStore:
+    """
+    In-memory store of the files used to spawn and render countryballs.
+
+    Wild cards are kept as raw bytes, ready to be uploaded. Card layers (backgrounds, artworks
+    and icons) are kept decoded and converted to RGBA, ready to be drawn on. Assets are keyed by
+    the path used to open them, and are loaded from the disk on a miss.
+
+    If enabled in the settings, `preload` fills the store when the cache is loaded, so spawns
+    and renders do not touch the disk afterwards. The total size is bounded, least recently used
+    assets are dropped first.
+
+    Parameters
+    ----------
+    max_size: int
+        Maximum size in bytes of the stored assets, images are counted decoded.
+    """
+
+    def __init__(self, max_size: int = 128 * 1024 * 1024):
+        self.assets: LRUCache[tuple[str, str], Asset] = LRUCache(
+            maxsize=max_size, getsizeof=_asset_size
+        )
+        self.lock = threading.Lock()
+
+    def configure(self, max_size: int):
+        """
+        Change the maximum size in bytes of the store. This empties it.
+        """
+        with self.lock:
+            self.assets = LRUCache(maxsize=max_size, getsizeof=_asset_size)
+        asset_memory.set(0)
+
+    def clear(self):
+        with self.lock:
+            self.assets.clear()
+        asset_memory.set(0)
+
+    def _get(self, kind: str, path: str) -> Asset | None:
+        with self.lock:
+            asset = self.assets.get((kind, path))
+        asset_lookups.labels(kind=kind, result="miss" if asset is None else "hit").inc()
+        return asset
+
+    def _store(self, kind: str, path: str, asset: Asset, evict: bool = True) -> bool:
+        size = _asset_size(asset)
+        with self.lock:
+            if size > self.assets.maxsize:
+                return False
+            if not evict and self.assets.currsize + size > self.assets.maxsize:
+                return False
+            self.assets[(kind, path)] = asset
+            asset_memory.set(self.assets.currsize)
+        return True
+
+    @staticmethod
+    def _load_bytes(path: str) -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    @staticmethod
+    def _load_image(path: str) -> Image.Image:
+        with Image.open(path) as image:
+            return image.convert("RGBA")
+
+    def get_bytes(self, path: str) -> bytes:
+        """
+        Return the content of a file.
+        """
+        data = self._get("file", path)
+        if data is None:
+            data = self._load_bytes(path)
+            self._store("file", path, data)
+        assert isinstance(data, bytes)
+        return data
+
+    def get_image(self, path: str, cached: bool = True) -> Image.Image:
+        """
+        Return a decoded RGBA image. With `cached=False`, it is read from the disk and not
+        stored.
+
+        The returned image is shared and must not be modified or closed, copy it first.
+        """
+        if not cached:
+            return self._load_image(path)
+        image = self._get("image", path)
+        if image is None:
+            image = self._load_image(path)
+            self._store("image", path, image)
+        assert isinstance(image, Image.Image)
+        return image
+
+    def preload(
+        self,
+        balls: Iterable["Ball"],
+        regimes: Iterable["Regime"],
+        economies: Iterable["Economy"],
+        specials: Iterable["Special"],
+    ):
+        """
+        Empty the store and load the assets referenced by the given models.
+
+        Shared assets are loaded first, then artworks until the budget is full. This blocks,
+        run it in an executor.
+        """
+        # imported here to avoid a circular import
+        from ballsdex.core.image_generator.image_gen import SOURCES_PATH
+
+        self.clear()
+        balls = [x for x in balls if x.enabled]
+        images = [str(SOURCES_PATH / "shiny.png")]
+        images.extend("." + x.background for x in regimes)
+        images.extend("." + x.background for x in specials if x.background)
+        images.extend("." + x.icon for x in economies)
+        files = ["." + x.wild_card for x in balls]
+        artworks = ["." + x.collection_card for x in balls]
+
+        loaded = skipped = 0
+        for kind, paths, loader in (
+            ("image", images, self._load_image),
+            ("file", files, self._load_bytes),
+            ("image", artworks, self._load_image),
+        ):
+            for i, path in enumerate(paths):
+                try:
+                    asset = loader(path)
+                except OSError:
+                    log.warning(f"Failed to preload asset {path}", exc_info=True)
+                    continue
+                if not self._store(kind, path, asset, evict=False):
+                    # the budget is full, the remaining assets will be loaded on demand
+                    skipped += len(paths) - i
+                    break
+                loaded += 1
+        log.info(
+            f"Preloaded {loaded} assets ({self.assets.currsize / 1024 / 1024:.0f}MB), "
+            f"{skipped} did not fit in the budget."
+        )
+
+
+asset_store = AssetStore()
@@ -7,6 +7,7 @@ import math
 import time
 import types
 from datetime import datetime
+from pathlib import Path
 from typing import TYPE_CHECKING, cast
 
 import aiohttp
@@ -23,8 +24,16 @@ from rich import box, print
 from rich.console import Console
 from rich.table import Table
 
+from ballsdex.core.assets import asset_store
+from ballsdex.core.caches import guild_configs, player_cache
+from ballsdex.core.catch_queue import CatchQueue
 from ballsdex.core.commands import Core
 from ballsdex.core.dev import Dev
+from ballsdex.core.image_generator.cache import card_cache
+from ballsdex.core.image_generator.image_gen import CardEncoding, configure_base_layers
+from ballsdex.core.image_generator.pool import RenderPool
+from ballsdex.core.inventory import owned_balls
+from ballsdex.core.message_filter import MessageFilter
 from ballsdex.core.metrics import PrometheusServer
 from ballsdex.core.models import (
     Ball,
@@ -33,10 +42,7 @@ from ballsdex.core.models import (
     Economy,
     Regime,
     Special,
-    balls,
-    economies,
-    regimes,
-    specials,
+    swap_model_caches,
 )
 from ballsdex.settings import settings
 
@@ -153,9 +159,34 @@ class BallsDexBot(commands.AutoShardedBot):
         self.catch_log: set[int] = set()
         self.command_log: set[int] = set()
         self.locked_balls = TTLCache(maxsize=99999, ttl=60 * 30)
+        self.message_filter = MessageFilter()
+
+        card_cache.configure(
+            settings.card_cache_size * 1024 * 1024,
+            Path(settings.card_cache_path) if settings.card_cache_path else None,
+        )
+        configure_base_layers(settings.card_base_layer_cache_size * 1024 * 1024)
+        asset_store.configure(settings.asset_cache_size * 1024 * 1024)
+        self.render_pool = RenderPool(
+            settings.render_pool_type,
+            settings.render_pool_size,
+            settings.render_pool_max_pending,
+            CardEncoding.from_settings(settings),
+            settings.card_base_layer_cache_size * 1024 * 1024,
+            settings.asset_cache_size * 1024 * 1024,
+        )
+        self.catch_queue = CatchQueue(
+            settings.catch_flush_interval / 1000, settings.catch_batch_size
+        )
 
         self.owner_ids: set
 
+    def dispatch(self, event_name: str, /, *args, **kwargs):
+        # drop the messages nothing listens to before a task is created for each listener
+        if event_name == "message" and not self.message_filter.accepts(args[0], self.owner_ids):
+            return
+        super().dispatch(event_name, *args, **kwargs)
+
     async def start_prometheus_server(self):
         self.prometheus_server = PrometheusServer(
             self, settings.prometheus_host, settings.prometheus_port
@@ -191,35 +222,48 @@ class BallsDexBot(commands.AutoShardedBot):
         table.add_column("Model", style="cyan")
         table.add_column("Count", justify="right", style="green")
 
-        balls.clear()
-        for ball in await Ball.all():
-            balls[ball.pk] = ball
-        table.add_row(settings.collectible_name.title() + "s", str(len(balls)))
-
-        regimes.clear()
-        for regime in await Regime.all():
-            regimes[regime.pk] = regime
-        table.add_row("Regimes", str(len(regimes)))
-
-        economies.clear()
-        for economy in await Economy.all():
-            economies[economy.pk] = economy
-        table.add_row("Economies", str(len(economies)))
-
-        specials.clear()
-        for special in await Special.all():
-            specials[special.pk] = special
-        table.add_row("Special events", str(len(specials)))
-
-        self.blacklist = set()
-        for blacklisted_id in await BlacklistedID.all().only("discord_id"):
-            self.blacklist.add(blacklisted_id.discord_id)
+        # everything is loaded before replacing the cache in a single step, commands running
+        # meanwhile keep seeing the previous models
+        new_balls = {x.pk: x for x in await Ball.all()}
+        new_regimes = {x.pk: x for x in await Regime.all()}
+        new_economies = {x.pk: x for x in await Economy.all()}
+        new_specials = {x.pk: x for x in await Special.all()}
+        swap_model_caches(new_balls, new_regimes, new_economies, new_specials)
+        table.add_row(settings.collectible_name.title() + "s", str(len(new_balls)))
+        table.add_row("Regimes", str(len(new_regimes)))
+        table.add_row("Economies", str(len(new_economies)))
+        table.add_row("Special events", str(len(new_specials)))
+
+        # rendered cards may depend on anything that was just reloaded, the base layers were
+        # dropped with the swap
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, card_cache.clear)
+        if settings.asset_preload:
+            await loop.run_in_executor(
+                None,
+                asset_store.preload,
+                list(new_balls.values()),
+                list(new_regimes.values()),
+                list(new_economies.values()),
+                list(new_specials.values()),
+            )
+        else:
+            asset_store.clear()
+
+        # assigned once complete, to never leave blacklisted users unchecked while loading
+        self.blacklist = {x.discord_id for x in await BlacklistedID.all().only("discord_id")}
         table.add_row("Blacklisted users", str(len(self.blacklist)))
 
-        self.blacklist_guild = set()
-        for blacklisted_id in await BlacklistedGuild.all().only("discord_id"):
-            self.blacklist_guild.add(blacklisted_id.discord_id)
+        self.blacklist_guild = {
+            x.discord_id for x in await BlacklistedGuild.all().only("discord_id")
+        }
         table.add_row("Blacklisted guilds", str(len(self.blacklist_guild)))
+        self.message_filter.update_blacklist(self.blacklist_guild)
+
+        await guild_configs.load()
+        table.add_row("Guild configs", str(len(guild_configs)))
+        player_cache.clear()
+        owned_balls.clear()
 
         log.info("Cache loaded, summary displayed below:")
         console = Console()
@@ -244,6 +288,8 @@ class BallsDexBot(commands.AutoShardedBot):
 
     async def setup_hook(self) -> None:
         await self.tree.set_translator(Translator())
+        self.render_pool.start()
+        self.catch_queue.start()
         log.info("Starting up with %s shards...", self.shard_count)
         if settings.gateway_url is None:
             return
@@ -257,6 +303,14 @@ class BallsDexBot(commands.AutoShardedBot):
             log.warning("Gateway proxy is not ready yet, waiting 30 more seconds...")
             await asyncio.sleep(30)
 
+    async def close(self) -> None:
+        await super().close()
+        self.render_pool.shutdown()
+
+    async def on_ballsdex_settings_change(self, guild: discord.Guild, **kwargs):
+        # the config may have been modified without going through the cache
+        await guild_configs.refresh(guild.id)
+
     async def on_ready(self):
         if self.cogs != {}:
             return  # bot is reconnecting, no need to setup again
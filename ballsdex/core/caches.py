@@ -0,0 +1,141 @@
+import logging
+
+from cachetools import TTLCache
+from prometheus_client import Counter
+
+from ballsdex.core.models import GuildConfig, Player
+
+log = logging.getLogger("ballsdex.core.caches")
+cache_lookups = Counter("model_cache", "Model cache lookups", ["model", "result"])
+
+PLAYER_CACHE_SIZE = 50_000
+PLAYER_CACHE_TTL = 600
+
+# The insert is skipped on conflict, and the existing row is then returned by the second part
+# of the union. Unlike DO UPDATE, this does not write a new row version for existing players.
+# Columns left out take the defaults of the database.
+PLAYER_UPSERT_QUERY = """
+WITH inserted AS (
+    INSERT INTO "player" ("discord_id") VALUES ($1)
+    ON CONFLICT ("discord_id") DO NOTHING
+    RETURNING *
+)
+SELECT * FROM inserted
+UNION ALL
+SELECT * FROM "player" WHERE "discord_id" = $1
+LIMIT 1
+"""
+
+
+class GuildConfigCache:
+    """
+    Process-wide cache of the `GuildConfig` objects.
+
+    All configs are loaded with the bot's cache, so a miss only happens for guilds without a
+    config yet, which is then created. The cached objects are the ones returned to the callers,
+    saving a modified config keeps the cache coherent. Changes made elsewhere (admin panel,
+    eval) are picked up on `ballsdex_settings_change` and on cache reloads.
+    """
+
+    def __init__(self):
+        self.configs: dict[int, GuildConfig] = {}
+
+    def __len__(self) -> int:
+        return len(self.configs)
+
+    def values(self):
+        return self.configs.values()
+
+    async def load(self):
+        configs: dict[int, GuildConfig] = {}
+        async for config in GuildConfig.all():
+            configs[config.guild_id] = config
+        self.configs = configs
+
+    def get(self, guild_id: int) -> GuildConfig | None:
+        """
+        Return the cached config of a guild, without querying the database.
+        """
+        config = self.configs.get(guild_id)
+        cache_lookups.labels(model="guildconfig", result="miss" if config is None else "hit").inc()
+        return config
+
+    async def get_or_create(self, guild_id: int) -> GuildConfig:
+        if config := self.get(guild_id):
+            return config
+        config, _ = await GuildConfig.get_or_create(guild_id=guild_id)
+        self.configs[guild_id] = config
+        return config
+
+    async def refresh(self, guild_id: int) -> GuildConfig | None:
+        """
+        Reload the config of a guild from the database.
+        """
+        config = await GuildConfig.get_or_none(guild_id=guild_id)
+        if config:
+            self.configs[guild_id] = config
+        else:
+            self.configs.pop(guild_id, None)
+        return config
+
+
+class PlayerCache:
+    """
+    Bounded cache of the `Player` objects, keyed by Discord ID.
+
+    Unlike guild configs, players are not all loaded, only the ones recently seen are kept, for
+    at most `ttl` seconds. A miss is resolved with a single query creating the player if needed.
+
+    The players cog writes through the cache when policies are changed or a player is deleted.
+    Changes made elsewhere (admin panel, eval) are picked up once the entry expires, or on cache
+    reloads.
+    """
+
+    def __init__(self, max_size: int = PLAYER_CACHE_SIZE, ttl: float = PLAYER_CACHE_TTL):
+        self.players: TTLCache[int, Player] = TTLCache(maxsize=max_size, ttl=ttl)
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def clear(self):
+        self.players.clear()
+
+    def get(self, discord_id: int) -> Player | None:
+        """
+        Return the cached player, without querying the database.
+        """
+        player = self.players.get(discord_id)
+        cache_lookups.labels(model="player", result="miss" if player is None else "hit").inc()
+        return player
+
+    async def get_or_create(self, discord_id: int) -> Player:
+        """
+        Replacement for `Player.get_or_create`, without the created flag.
+        """
+        if player := self.get(discord_id):
+            return player
+        connection = Player._meta.db
+        rows = await connection.execute_query_dict(PLAYER_UPSERT_QUERY, [discord_id])
+        if rows:
+            player = Player._init_from_db(**rows[0])
+        else:
+            # inserted concurrently by another transaction, not visible in our snapshot
+            player = await Player.get(discord_id=discord_id)
+        # another task may have resolved the same miss meanwhile, keep a single object
+        return self.players.setdefault(discord_id, player)
+
+    def update(self, player: Player):
+        """
+        Store a player after it was saved.
+        """
+        self.players[player.discord_id] = player
+
+    def discard(self, discord_id: int):
+        """
+        Drop a player after it was deleted.
+        """
+        self.players.pop(discord_id, None)
+
+
+guild_configs = GuildConfigCache()
+player_cache = PlayerCache()
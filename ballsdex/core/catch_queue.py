@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Iterator
+
+from prometheus_client import Gauge, Histogram
+from tortoise.exceptions import IntegrityError
+from tortoise.timezone import now as datetime_now
+
+from ballsdex.core.inventory import owned_balls
+from ballsdex.core.models import BallInstance
+
+log = logging.getLogger("ballsdex.core.catch_queue")
+catch_queue_size = Gauge("catch_queue_size", "Caught countryballs waiting to be written")
+catch_flush_duration = Histogram(
+    "catch_flush_duration", "Time spent writing a batch of caught countryballs"
+)
+
+# number of primary keys taken at once from the sequence of the table
+ID_RESERVATION = 100
+RESERVE_IDS_QUERY = (
+    "SELECT nextval(pg_get_serial_sequence('ballinstance', 'id')) AS id "
+    "FROM generate_series(1, $1)"
+)
+
+
+class CatchQueue:
+    """
+    Write-behind queue of the new `BallInstance` rows.
+
+    Instances are given their primary key immediately, from ids reserved in advance in the
+    sequence of the table, so they can be displayed before being written. They are then
+    inserted in batches every `interval` seconds, and on shutdown. Reserved ids that end up
+    unused only leave a gap in the sequence.
+
+    Until it is written, an instance is not returned by queries, this lasts at most `interval`
+    seconds, and it is lost if the bot crashes meanwhile. This is why the queue is disabled by
+    default. The bitmaps of owned countryballs modified by the catches are written along.
+
+    Parameters
+    ----------
+    interval: float
+        Seconds between two writes. With 0, instances are written immediately.
+    batch_size: int
+        Maximum number of instances inserted by a single query.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pending: list[BallInstance] = []
+        self.ids: deque[int] = deque()
+        self.ids_lock = asyncio.Lock()
+        self.flush_lock = asyncio.Lock()
+        self.task: asyncio.Task | None = None
+        owned_balls.pending_balls = self.pending_balls
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def start(self):
+        if self.interval > 0 and self.task is None:
+            self.task = asyncio.create_task(self.flush_loop())
+
+    async def stop(self):
+        """
+        Stop the periodic writes and write everything left.
+        """
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("Failed to write the caught countryballs")
+        if self.pending:
+            log.error(
+                "%d caught countryballs could not be written: %s",
+                len(self.pending),
+                ", ".join(
+                    f"(id={x.pk}, ball={x.ball_id}, player={x.player_id})" for x in self.pending
+                ),
+            )
+
+    def pending_balls(self, player_id: int) -> Iterator[int]:
+        return (x.ball_id for x in self.pending if x.player_id == player_id)
+
+    async def reserve_id(self) -> int:
+        while not self.ids:
+            async with self.ids_lock:
+                if self.ids:
+                    break
+                rows = await BallInstance._meta.db.execute_query_dict(
+                    RESERVE_IDS_QUERY, [ID_RESERVATION]
+                )
+                self.ids.extend(row["id"] for row in rows)
+        return self.ids.popleft()
+
+    async def create(self, **kwargs) -> tuple[BallInstance, bool]:
+        """
+        Replacement for `BallInstance.create`, the instance is written later.
+
+        Returns
+        -------
+        tuple[BallInstance, bool]
+            The new instance, and whether the player did not own this countryball before.
+        """
+        if self.interval <= 0:
+            instance = BallInstance(**kwargs)
+            # a bitmap loaded after the insert would already contain the new ball
+            await owned_balls.get(instance.player_id)
+            await instance.save(force_create=True)
+            is_new = await owned_balls.add(instance.player_id, instance.ball_id, instance.pk)
+            await owned_balls.flush(instance.player_id)
+            return instance, is_new
+
+        kwargs.setdefault("catch_date", datetime_now())
+        instance = BallInstance(id=await self.reserve_id(), **kwargs)
+        is_new = await owned_balls.add(instance.player_id, instance.ball_id, instance.pk)
+        self.pending.append(instance)
+        catch_queue_size.set(len(self.pending))
+        return instance, is_new
+
+    async def flush(self):
+        async with self.flush_lock:
+            while self.pending:
+                batch = self.pending[: self.batch_size]
+                try:
+                    with catch_flush_duration.time():
+                        await BallInstance.bulk_create(batch)
+                except Exception:
+                    log.exception(
+                        "Failed to write %d caught countryballs, retrying one by one", len(batch)
+                    )
+                    done = await self.write_each(batch)
+                else:
+                    for instance in batch:
+                        instance._saved_in_db = True
+                    done = len(batch)
+                del self.pending[:done]
+                if done < len(batch):
+                    break
+            catch_queue_size.set(len(self.pending))
+            await owned_balls.flush()
+
+    async def write_each(self, batch: list[BallInstance]) -> int:
+        """
+        Write the instances of a failed batch separately, to only lose the invalid ones.
+
+        Returns
+        -------
+        int
+            The number of instances processed. It is lower than the size of the batch if the
+            database is not usable, the remaining instances are then kept for later.
+        """
+        for i, instance in enumerate(batch):
+            try:
+                await instance.save(force_create=True)
+            except IntegrityError:
+                # the ball or the player was deleted meanwhile
+                log.exception(
+                    "Dropped caught countryball (id=%s, ball=%s, player=%s)",
+                    instance.pk,
+                    instance.ball_id,
+                    instance.player_id,
+                )
+            except Exception:
+                log.exception("Failed to write caught countryballs")
+                return i
+        return len(batch)
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Failed to write the caught countryballs")
@@ -5,6 +5,8 @@ from typing import TYPE_CHECKING
 from discord.ext import commands
 from tortoise import Tortoise
 
+from ballsdex.core.inventory import owned_balls
+
 log = logging.getLogger("ballsdex.core.commands")
 
 if TYPE_CHECKING:
@@ -62,9 +64,13 @@ class Core(commands.Cog):
         Reload the cache of database models.
 
         This is needed each time the database is updated, otherwise changes won't reflect until
-        next start.
+        next start. The bitmaps of owned countryballs that do not match the inventories are
+        also rebuilt.
         """
         await self.bot.load_cache()
+        # pending catches would be seen as missing from the inventories
+        await self.bot.catch_queue.flush()
+        await owned_balls.reconcile()
         await ctx.message.add_reaction("✅")
 
     @commands.command()
@@ -0,0 +1,104 @@
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from cachetools import LRUCache
+from prometheus_client import Counter
+
+log = logging.getLogger("ballsdex.core.image_generator.cache")
+card_cache_lookups = Counter("card_cache", "Rendered card cache lookups", ["tier", "result"])
+
+
+class CardCache:
+    """
+    Content-addressed cache of encoded cards, keyed by `card_key`.
+
+    The first tier is an in-memory LRU bounded by the total size of the stored images. An
+    optional second tier stores the images on disk, and entries found there are promoted back
+    to memory.
+
+    This is accessed from the rendering threads, all operations are guarded by a lock.
+
+    Parameters
+    ----------
+    max_size: int
+        Maximum size in bytes of the in-memory tier.
+    path: Path | None
+        Folder where the on-disk tier is stored. Disabled if `None`.
+    """
+
+    def __init__(self, max_size: int = 64 * 1024 * 1024, path: Path | None = None):
+        self.memory: LRUCache[str, bytes] = LRUCache(maxsize=max_size, getsizeof=len)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def configure(self, max_size: int, path: Path | None = None):
+        """
+        Resize the cache and change the on-disk location. This empties the memory tier.
+        """
+        with self.lock:
+            self.memory = LRUCache(maxsize=max_size, getsizeof=len)
+            self.path = path
+        if path:
+            path.mkdir(parents=True, exist_ok=True)
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.path
+        return self.path / key[:2] / key
+
+    def get(self, key: str) -> bytes | None:
+        with self.lock:
+            data = self.memory.get(key)
+        if data is not None:
+            card_cache_lookups.labels(tier="memory", result="hit").inc()
+            return data
+        card_cache_lookups.labels(tier="memory", result="miss").inc()
+
+        if not self.path:
+            return None
+        try:
+            data = self._disk_path(key).read_bytes()
+        except FileNotFoundError:
+            card_cache_lookups.labels(tier="disk", result="miss").inc()
+            return None
+        card_cache_lookups.labels(tier="disk", result="hit").inc()
+        self._store_memory(key, data)
+        return data
+
+    def _store_memory(self, key: str, data: bytes):
+        if len(data) > self.memory.maxsize:
+            return
+        with self.lock:
+            self.memory[key] = data
+
+    def put(self, key: str, data: bytes):
+        self._store_memory(key, data)
+        if not self.path:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # write then rename, a concurrent reader must never see a partial file
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            log.warning(f"Failed writing card {key} to the disk cache", exc_info=True)
+
+    def clear(self):
+        """
+        Drop every cached card, in memory and on disk.
+        """
+        with self.lock:
+            self.memory.clear()
+        if not self.path:
+            return
+        for child in self.path.iterdir():
+            if child.is_dir():
+                shutil.rmtree(child, ignore_errors=True)
+        log.debug("Card cache cleared")
+
+
+card_cache = CardCache()
@@ -1,12 +1,20 @@
+import hashlib
 import os
 import textwrap
+import threading
+from dataclasses import astuple, dataclass
+from io import BytesIO
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+from cachetools import LRUCache
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
+from ballsdex.core.assets import asset_store
+
 if TYPE_CHECKING:
     from ballsdex.core.models import BallInstance
+    from ballsdex.settings import Settings
 
 
 SOURCES_PATH = Path(os.path.dirname(os.path.abspath(__file__)), "./src")
@@ -26,31 +34,213 @@ stats_font = ImageFont.truetype(str(SOURCES_PATH / "Bobby Jones Soft.otf"), 130)
 credits_font = ImageFont.truetype(str(SOURCES_PATH / "arial.ttf"), 40)
 
 
+@dataclass(frozen=True, slots=True)
+class CardSpec:
+    """
+    All the inputs that have an impact on the rendered card. Two instances with the same spec
+    will always produce the exact same image, which makes it usable as a cache key.
+
+    Attributes
+    ----------
+    title: str
+        Name displayed on top of the card
+    capacity_name: str
+        Name of the ball's ability
+    capacity_description: str
+        Description of the ball's ability
+    credits: str
+        Author of the artwork
+    background: str
+        Path to the background image (regime, special or shiny)
+    artwork: str
+        Path to the collection card artwork
+    economy_icon: str | None
+        Path to the economy icon, if any
+    health: int
+        Health stat of the instance, bonus included
+    attack: int
+        Attack stat of the instance, bonus included
+    shiny: bool
+        Whether the instance is shiny, changes the color of the health stat
+    """
+
+    title: str
+    capacity_name: str
+    capacity_description: str
+    credits: str
+    background: str
+    artwork: str
+    economy_icon: str | None
+    health: int
+    attack: int
+    shiny: bool
+
+    @classmethod
+    def from_instance(cls, ball_instance: "BallInstance") -> "CardSpec":
+        ball = ball_instance.countryball
+        if ball_instance.shiny:
+            background = str(SOURCES_PATH / "shiny.png")
+        elif special_image := ball_instance.special_card:
+            background = "." + special_image
+        else:
+            background = "." + ball.cached_regime.background
+        economy = ball.cached_economy
+        return cls(
+            title=ball.short_name or ball.country,
+            capacity_name=ball.capacity_name,
+            capacity_description=ball.capacity_description,
+            credits=ball.credits,
+            background=background,
+            artwork="." + ball.collection_card,
+            economy_icon="." + economy.icon if economy else None,
+            health=ball_instance.health,
+            attack=ball_instance.attack,
+            shiny=ball_instance.shiny,
+        )
+
+    @property
+    def digest(self) -> str:
+        """
+        A stable hash of this spec, used as a content address.
+        """
+        return hashlib.sha1(repr(astuple(self)).encode()).hexdigest()
+
+    @property
+    def base_key(self) -> tuple:
+        """
+        The part of the spec shared by all instances of a ball with the same background.
+        """
+        return (
+            self.title,
+            self.capacity_name,
+            self.capacity_description,
+            self.credits,
+            self.background,
+            self.artwork,
+            self.economy_icon,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class CardEncoding:
+    """
+    How rendered cards are encoded before being uploaded.
+
+    Attributes
+    ----------
+    format: str
+        One of "png", "webp" or "jpeg".
+    quality: int
+        Quality between 1 and 100, used by lossy formats (webp and jpeg).
+    optimize: bool
+        Make an extra pass to reduce the size (png and jpeg). Slower to encode.
+    compress_level: int
+        zlib compression level between 0 and 9 (png only).
+    scale: float
+        Resize factor applied to the card before encoding, 1 keeps the original size.
+    """
+
+    format: str = "png"
+    quality: int = 90
+    optimize: bool = False
+    compress_level: int = 6
+    scale: float = 1
+
+    def __post_init__(self):
+        if self.format not in ("png", "webp", "jpeg"):
+            raise ValueError(f"Unsupported card format {self.format!r}")
+        if not 0 < self.scale <= 1:
+            raise ValueError("The card scale must be between 0 (excluded) and 1")
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "CardEncoding":
+        return cls(
+            format=settings.card_format,
+            quality=settings.card_quality,
+            optimize=settings.card_optimize,
+            compress_level=settings.card_compress_level,
+            scale=settings.card_scale,
+        )
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self.format == "jpeg" else self.format
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.format}"
+
+    def save_options(self) -> dict:
+        """
+        Keyword arguments for `PIL.Image.Image.save`.
+        """
+        if self.format == "png":
+            return {
+                "format": "png",
+                "optimize": self.optimize,
+                "compress_level": self.compress_level,
+            }
+        if self.format == "jpeg":
+            return {"format": "jpeg", "quality": self.quality, "optimize": self.optimize}
+        return {"format": "webp", "quality": self.quality}
+
+
+DEFAULT_ENCODING = CardEncoding()
+
+
+def card_key(spec: CardSpec, encoding: CardEncoding) -> str:
+    """
+    Cache key of an encoded card.
+    """
+    return f"{spec.digest}-{hashlib.sha1(repr(astuple(encoding)).encode()).hexdigest()[:8]}"
+
+
 def draw_card(ball_instance: "BallInstance"):
-    ball = ball_instance.countryball
-    ball_health = (237, 115, 101, 255)
-
-    if ball_instance.shiny:
-        image = Image.open(str(SOURCES_PATH / "shiny.png"))
-        ball_health = (255, 255, 255, 255)
-    elif special_image := ball_instance.special_card:
-        image = Image.open("." + special_image)
-    else:
-        image = Image.open("." + ball.cached_regime.background)
-    image = image.convert("RGBA")
-    icon = (
-        Image.open("." + ball.cached_economy.icon).convert("RGBA") if ball.cached_economy else None
-    )
+    return render_card(CardSpec.from_instance(ball_instance))
+
+
+def _image_size(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+# base layers are full size RGBA images (~11MB each), the cache is bounded in bytes
+base_layers: LRUCache[tuple, Image.Image] = LRUCache(
+    maxsize=128 * 1024 * 1024, getsizeof=_image_size
+)
+base_layers_lock = threading.Lock()
+
+
+def configure_base_layers(max_size: int):
+    """
+    Change the maximum size in bytes of the base layers cache. This empties it.
+    """
+    global base_layers
+    with base_layers_lock:
+        base_layers = LRUCache(maxsize=max_size, getsizeof=_image_size)
+
+
+def clear_base_layers():
+    with base_layers_lock:
+        base_layers.clear()
+
+
+def draw_base_layer(spec: CardSpec, cached: bool = True) -> Image.Image:
+    """
+    Draw everything that is shared between all instances of a ball with the same background,
+    which is everything except the stats. With `cached=False`, assets are read from the disk.
+    """
+    # assets are shared, only copies are modified
+    image = asset_store.get_image(spec.background, cached).copy()
 
     draw = ImageDraw.Draw(image)
     draw.text(
         (50, 20),
-        ball.short_name or ball.country,
+        spec.title,
         font=title_font,
         stroke_width=2,
         stroke_fill=(0, 0, 0, 255),
     )
-    for i, line in enumerate(textwrap.wrap(f"Ability: {ball.capacity_name}", width=26)):
+    for i, line in enumerate(textwrap.wrap(f"Ability: {spec.capacity_name}", width=26)):
         draw.text(
             (100, 1050 + 100 * i),
             line,
@@ -59,7 +249,7 @@ def draw_card(ball_instance: "BallInstance"):
             stroke_width=2,
             stroke_fill=(0, 0, 0, 255),
         )
-    for i, line in enumerate(textwrap.wrap(ball.capacity_description, width=32)):
+    for i, line in enumerate(textwrap.wrap(spec.capacity_description, width=32)):
         draw.text(
             (60, 1300 + 80 * i),
             line,
@@ -67,9 +257,57 @@ def draw_card(ball_instance: "BallInstance"):
             stroke_width=1,
             stroke_fill=(0, 0, 0, 255),
         )
+    draw.text(
+        (30, 1870),
+        # Modifying the line below is breaking the licence as you are removing credits
+        # If you don't want to receive a DMCA, just don't
+        "Created by El Laggron\n" f"Artwork author: {spec.credits}",
+        font=credits_font,
+        fill=(0, 0, 0, 255),
+        stroke_width=0,
+        stroke_fill=(255, 255, 255, 255),
+    )
+
+    artwork = ImageOps.fit(asset_store.get_image(spec.artwork, cached), artwork_size)  # type: ignore
+    image.paste(artwork, CORNERS[0])  # type: ignore
+    artwork.close()
+
+    if spec.economy_icon:
+        icon = ImageOps.fit(asset_store.get_image(spec.economy_icon, cached), (192, 192))
+        image.paste(icon, (1200, 30), mask=icon)
+        icon.close()
+
+    return image
+
+
+def get_base_layer(spec: CardSpec) -> Image.Image:
+    """
+    Return the cached base layer for this spec, drawing it if needed.
+
+    The returned image is shared and must not be modified, copy it first.
+    """
+    key = spec.base_key
+    with base_layers_lock:
+        image = base_layers.get(key)
+    if image is None:
+        image = draw_base_layer(spec)
+        if _image_size(image) <= base_layers.maxsize:
+            with base_layers_lock:
+                base_layers[key] = image
+    return image
+
+
+def render_card(spec: CardSpec, cached: bool = True):
+    ball_health = (255, 255, 255, 255) if spec.shiny else (237, 115, 101, 255)
+
+    if cached:
+        image = get_base_layer(spec).copy()
+    else:
+        image = draw_base_layer(spec, cached=False)
+    draw = ImageDraw.Draw(image)
     draw.text(
         (320, 1670),
-        str(ball_instance.health),
+        str(spec.health),
         font=stats_font,
         fill=ball_health,
         stroke_width=1,
@@ -77,31 +315,54 @@ def draw_card(ball_instance: "BallInstance"):
     )
     draw.text(
         (1120, 1670),
-        str(ball_instance.attack),
+        str(spec.attack),
         font=stats_font,
         fill=(252, 194, 76, 255),
         stroke_width=1,
         stroke_fill=(0, 0, 0, 255),
         anchor="ra",
     )
-    draw.text(
-        (30, 1870),
-        # Modifying the line below is breaking the licence as you are removing credits
-        # If you don't want to receive a DMCA, just don't
-        "Created by El Laggron\n" f"Artwork author: {ball.credits}",
-        font=credits_font,
-        fill=(0, 0, 0, 255),
-        stroke_width=0,
-        stroke_fill=(255, 255, 255, 255),
-    )
+    return image
 
-    artwork = Image.open("." + ball.collection_card).convert("RGBA")
-    image.paste(ImageOps.fit(artwork, artwork_size), CORNERS[0])  # type: ignore
 
-    if icon:
-        icon = ImageOps.fit(icon, (192, 192))
-        image.paste(icon, (1200, 30), mask=icon)
-        icon.close()
-    artwork.close()
+def encode_card(
+    spec: CardSpec, encoding: CardEncoding = DEFAULT_ENCODING, cached: bool = True
+) -> bytes:
+    """
+    Render the card and encode it. This is the job executed by the render pool workers.
 
-    return image
+    With `cached=False`, the base layers and assets caches are bypassed.
+    """
+    image = render_card(spec, cached)
+    if encoding.scale != 1:
+        resized = image.resize(
+            (round(image.width * encoding.scale), round(image.height * encoding.scale)),
+            Image.Resampling.LANCZOS,
+        )
+        image.close()
+        image = resized
+    if encoding.format == "jpeg":
+        # no transparency support
+        converted = image.convert("RGB")
+        image.close()
+        image = converted
+    buffer = BytesIO()
+    image.save(buffer, **encoding.save_options())
+    image.close()
+    return buffer.getvalue()
+
+
+def preload(base_layer_cache_size: int | None = None, asset_cache_size: int | None = None):
+    """
+    Initializer for the render pool workers. Fonts are loaded when this module is imported,
+    this also forces the glyphs of the stats to be rasterized once.
+
+    Worker processes do not share the caches of the bot, their sizes in bytes are given here.
+    """
+    if base_layer_cache_size is not None:
+        configure_base_layers(base_layer_cache_size)
+    if asset_cache_size is not None:
+        asset_store.configure(asset_cache_size)
+    for font in (title_font, capacity_name_font, capacity_description_font, credits_font):
+        font.getbbox("A")
+    stats_font.getbbox("0123456789")
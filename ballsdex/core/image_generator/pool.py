@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from prometheus_client import Gauge, Histogram
+
+from ballsdex.core.image_generator.cache import card_cache
+from ballsdex.core.image_generator.image_gen import (
+    DEFAULT_ENCODING,
+    CardEncoding,
+    CardSpec,
+    card_key,
+    encode_card,
+    preload,
+)
+from ballsdex.core.models import cache_version
+
+log = logging.getLogger("ballsdex.core.image_generator.pool")
+
+render_jobs = Gauge("card_render_jobs", "Card render jobs in the pool", ["state"])
+render_duration = Histogram(
+    "card_render_duration",
+    "Time taken by a card render job once submitted to the workers",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf")),
+)
+
+
+class RenderPool:
+    """
+    Long-lived pool of workers rendering the cards, owned by the bot.
+
+    Jobs are `CardSpec` objects, which are self-contained and picklable, so the workers can
+    either be threads or processes. Each worker runs `preload` once when started.
+
+    Only `max_pending` jobs are submitted to the executor at once, the other callers wait for
+    a slot, which keeps bursts from piling up unbounded work.
+
+    Thread workers share the base layers and assets caches of the bot. Each worker process has
+    its own, the budgets are then divided between the workers so the total memory does not
+    grow with their number. Those caches cannot be cleared from the bot, the worker processes
+    are replaced when the models are reloaded instead.
+
+    Parameters
+    ----------
+    kind: str
+        Either `"thread"` or `"process"`.
+    size: int | None
+        Number of workers. Defaults to the number of CPUs.
+    max_pending: int
+        Maximum number of jobs submitted to the workers at the same time.
+    encoding: CardEncoding
+        How the cards are encoded.
+    base_layer_cache_size: int
+        Size in bytes of the base layers cache, split between the worker processes.
+    asset_cache_size: int
+        Size in bytes of the assets cache, split between the worker processes.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        size: int | None = None,
+        max_pending: int = 64,
+        encoding: CardEncoding = DEFAULT_ENCODING,
+        base_layer_cache_size: int = 128 * 1024 * 1024,
+        asset_cache_size: int = 128 * 1024 * 1024,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown render pool type {kind!r}, expected thread or process")
+        self.kind = kind
+        self.size = size
+        self.max_pending = max_pending
+        self.encoding = encoding
+        self.base_layer_cache_size = base_layer_cache_size
+        self.asset_cache_size = asset_cache_size
+        self.executor: Executor | None = None
+        self.semaphore = asyncio.Semaphore(max_pending)
+        self.waiting = 0
+        self.running = 0
+        cache_version.subscribe(self.reload)
+
+    def start(self):
+        if self.executor is not None:
+            return
+        if self.kind == "process":
+            workers = self.size or os.cpu_count() or 1
+            # forking a process with a running event loop and threads is unsafe
+            self.executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload,
+                initargs=(
+                    self.base_layer_cache_size // workers,
+                    self.asset_cache_size // workers,
+                ),
+            )
+        else:
+            self.executor = ThreadPoolExecutor(
+                self.size, thread_name_prefix="card-render", initializer=preload
+            )
+        log.info(f"Render pool started with {self.executor._max_workers} {self.kind} workers.")
+
+    def shutdown(self):
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        log.info("Render pool stopped.")
+
+    def reload(self):
+        """
+        Replace the worker processes, which would keep rendering outdated assets. Jobs already
+        submitted finish in the previous processes, the new ones are started on the next render.
+        """
+        if self.kind != "process" or self.executor is None:
+            return
+        self.executor.shutdown(wait=False)
+        self.executor = None
+        log.info("Render pool workers replaced after a cache reload.")
+
+    def _update_metrics(self):
+        render_jobs.labels(state="waiting").set(self.waiting)
+        render_jobs.labels(state="running").set(self.running)
+
+    async def _cache_call(self, func, *args):
+        # the disk tier must not block the event loop
+        if card_cache.path:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def render(self, spec: CardSpec) -> bytes:
+        """
+        Return the encoded card for this spec, from the card cache or from a worker.
+        """
+        key = card_key(spec, self.encoding)
+        if (data := await self._cache_call(card_cache.get, key)) is not None:
+            return data
+
+        self.start()
+        assert self.executor
+        loop = asyncio.get_running_loop()
+
+        self.waiting += 1
+        self._update_metrics()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        self._update_metrics()
+        try:
+            t1 = time.perf_counter()
+            data = await loop.run_in_executor(self.executor, encode_card, spec, self.encoding)
+            render_duration.observe(time.perf_counter() - t1)
+        finally:
+            self.running -= 1
+            self._update_metrics()
+            self.semaphore.release()
+
+        await self._cache_call(card_cache.put, key, data)
+        return data
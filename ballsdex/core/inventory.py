@@ -0,0 +1,345 @@
+import logging
+from collections import Counter
+from typing import TYPE_CHECKING, Callable, Iterable, Type
+
+from cachetools import TTLCache
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Subquery
+from tortoise.functions import Count
+
+from ballsdex.core.caches import cache_lookups
+from ballsdex.core.models import BallInstance, Player, PlayerOwnedBalls
+
+if TYPE_CHECKING:
+    from tortoise import BaseDBAsyncClient
+
+log = logging.getLogger("ballsdex.core.inventory")
+
+OWNED_BALLS_CACHE_SIZE = 50_000
+OWNED_BALLS_CACHE_TTL = 600
+BALL_COUNTS_CACHE_SIZE = 10_000
+BALL_COUNTS_CACHE_TTL = 600
+
+
+# deletes the persisted bitmaps that disagree with the inventories, in either direction
+# bytea bits are numbered from the least significant bit of the first byte, like to_bytes does
+RECONCILE_QUERY = """
+DELETE FROM "playerownedballs" AS o
+WHERE EXISTS (
+    SELECT 1 FROM "ballinstance" AS i
+    WHERE i."player_id" = o."player_id"
+    -- OR does not guarantee the evaluation order, get_bit fails past the end of the bitmap
+    AND CASE
+        WHEN i."ball_id" < length(o."bitmap") * 8 THEN get_bit(o."bitmap", i."ball_id")
+        ELSE 0
+    END = 0
+) OR EXISTS (
+    SELECT 1 FROM generate_series(0, length(o."bitmap") * 8 - 1) AS b("ball_id")
+    WHERE get_bit(o."bitmap", b."ball_id") = 1
+    AND NOT EXISTS (
+        SELECT 1 FROM "ballinstance" AS i
+        WHERE i."player_id" = o."player_id" AND i."ball_id" = b."ball_id"
+    )
+)
+RETURNING o."player_id"
+"""
+
+
+def to_bitmap(ball_ids: Iterable[int]) -> int:
+    bitmap = 0
+    for ball_id in ball_ids:
+        bitmap |= 1 << ball_id
+    return bitmap
+
+
+class OwnedBallsCache:
+    """
+    Bitmaps of the countryballs owned by each player, persisted in `PlayerOwnedBalls`.
+
+    Bit N of a player's bitmap is set if they own at least one instance of the ball with the
+    primary key N, telling if a catch is new is a bit test. Bitmaps are read lazily, kept in a
+    bounded LRU for at most `OWNED_BALLS_CACHE_TTL` seconds, and built from the inventory the
+    first time a player is seen.
+
+    They are maintained incrementally: catches with `add`, written with the caught
+    countryballs by the catch queue, and other changes of ownership (trades, donations,
+    fusions, deletions) with `update`, written immediately.
+
+    The same hooks maintain the number of instances of each ball owned by the recently seen
+    players, loaded with `get_counts`. Those counts are only kept in memory, for at most
+    `BALL_COUNTS_CACHE_TTL` seconds.
+
+    Other processes, like the admin panel, delete the persisted bitmaps they make outdated.
+    The bot picks the change up once its entry expires, and a catch is only reported as new
+    once confirmed by the database. `reconcile` repairs the changes made by any other mean.
+
+    Attributes
+    ----------
+    pending_balls: Callable[[int], Iterable[int]]
+        Returns the ball IDs given to a player but not written yet, set by the catch queue.
+    listeners: list[Callable[[int], None]]
+        Called with the ID of a player when their inventory changes, to invalidate dependent
+        caches.
+    """
+
+    def __init__(self, max_size: int = OWNED_BALLS_CACHE_SIZE):
+        self.bitmaps: TTLCache[int, int] = TTLCache(maxsize=max_size, ttl=OWNED_BALLS_CACHE_TTL)
+        # bitmaps waiting to be written, kept here if evicted from the LRU meanwhile
+        self.dirty: dict[int, int] = {}
+        self.counts: TTLCache[int, Counter[int]] = TTLCache(
+            maxsize=BALL_COUNTS_CACHE_SIZE, ttl=BALL_COUNTS_CACHE_TTL
+        )
+        self.pending_balls: Callable[[int], Iterable[int]] = lambda player_id: ()
+        self.listeners: list[Callable[[int], None]] = []
+
+    def __len__(self) -> int:
+        return len(self.bitmaps)
+
+    def clear(self):
+        self.bitmaps.clear()
+        self.counts.clear()
+
+    async def reconcile(self) -> int:
+        """
+        Delete the persisted bitmaps that do not match the inventories, and drop the players
+        concerned from memory. They are built again when next read, this repairs the changes of
+        ownership made without the hooks.
+
+        Returns
+        -------
+        int
+            The number of players whose bitmap was deleted.
+        """
+        await self.flush()
+        connection = PlayerOwnedBalls._meta.db
+        rows = await connection.execute_query_dict(RECONCILE_QUERY)
+        for row in rows:
+            self.forget(row["player_id"])
+        return len(rows)
+
+    async def get(self, player_id: int) -> int:
+        """
+        Return the bitmap of a player, loading it if needed.
+        """
+        bitmap = self.bitmaps.get(player_id)
+        if bitmap is None:
+            bitmap = self.dirty.get(player_id)
+        cache_lookups.labels(model="owned_balls", result="miss" if bitmap is None else "hit").inc()
+        if bitmap is not None:
+            return bitmap
+
+        row = await PlayerOwnedBalls.get_or_none(player_id=player_id)
+        if row:
+            bitmap = int.from_bytes(row.bitmap, "little")
+        else:
+            bitmap = to_bitmap(
+                await BallInstance.filter(player_id=player_id)
+                .distinct()
+                .values_list("ball_id", flat=True)
+            )
+        bitmap |= to_bitmap(self.pending_balls(player_id))
+        # keep the bits set by catches recorded while querying
+        bitmap |= self.bitmaps.get(player_id, 0)
+        self.bitmaps[player_id] = bitmap
+        if not row:
+            self.dirty[player_id] = bitmap
+        return bitmap
+
+    def notify(self, player_id: int):
+        for listener in self.listeners:
+            listener(player_id)
+
+    async def get_counts(self, player_id: int) -> Counter[int]:
+        """
+        Return the number of instances owned by a player for each ball ID, loading it if needed.
+        The returned counter must not be modified.
+        """
+        counts = self.counts.get(player_id)
+        cache_lookups.labels(model="ball_counts", result="miss" if counts is None else "hit").inc()
+        if counts is not None:
+            return counts
+
+        rows = (
+            await BallInstance.filter(player_id=player_id)
+            .annotate(count=Count("id"))
+            .group_by("ball_id")
+            .values_list("ball_id", "count")
+        )
+        counts = Counter(dict(rows))
+        counts.update(self.pending_balls(player_id))
+        # another task may have loaded the same player meanwhile, keep a single counter
+        return self.counts.setdefault(player_id, counts)
+
+    def set(self, player_id: int, bitmap: int):
+        self.bitmaps[player_id] = bitmap
+        self.dirty[player_id] = bitmap
+
+    async def add(self, player_id: int, ball_id: int, instance_id: int | None = None) -> bool:
+        """
+        Record a caught countryball. The bitmap is written on the next `flush`.
+
+        Parameters
+        ----------
+        player_id: int
+            Primary key of the player.
+        ball_id: int
+            Primary key of the caught ball.
+        instance_id: int | None
+            Primary key of the caught instance, ignored when confirming it is new.
+
+        Returns
+        -------
+        bool
+            `True` if the player did not own this countryball before.
+        """
+        self.notify(player_id)
+        if (counts := self.counts.get(player_id)) is not None:
+            counts[ball_id] += 1
+        bitmap = await self.get(player_id)
+        mask = 1 << ball_id
+        if bitmap & mask:
+            return False
+        # the bitmap may miss instances given by another process, confirm before reporting it
+        query = BallInstance.filter(player_id=player_id, ball_id=ball_id)
+        if instance_id is not None:
+            query = query.exclude(id=instance_id)
+        owned = await query.exists()
+        self.set(player_id, await self.get(player_id) | mask)
+        return not owned
+
+    async def update(
+        self, player_id: int, gained: Iterable[int] = (), lost: Iterable[int] = ()
+    ) -> int:
+        """
+        Apply a change of ownership, once the instances are saved, and write the bitmap.
+
+        Parameters
+        ----------
+        player_id: int
+            Primary key of the player.
+        gained: Iterable[int]
+            IDs of the balls of the instances the player received, once per instance.
+        lost: Iterable[int]
+            IDs of the balls of the instances the player no longer has, once per instance. A
+            bit is only cleared if no other instance of the ball is left.
+        """
+        self.notify(player_id)
+        gained, lost = list(gained), list(lost)
+        bitmap = await self.get(player_id) | to_bitmap(gained)
+        counts = self.counts.get(player_id)
+        if counts is not None:
+            counts.update(gained)
+            counts.subtract(lost)
+            # drop the balls no longer owned, the counter must stay usable as a ranking
+            for ball_id in set(lost):
+                if counts[ball_id] <= 0:
+                    del counts[ball_id]
+        if lost := set(lost):
+            # the database decides, the counts may have missed changes made while loading them
+            remaining = set(
+                await BallInstance.filter(player_id=player_id, ball_id__in=lost)
+                .distinct()
+                .values_list("ball_id", flat=True)
+            )
+            remaining.update(self.pending_balls(player_id))
+            bitmap &= ~to_bitmap(lost - remaining)
+            if counts is not None and set(counts) & lost != remaining:
+                # reloaded on next use
+                self.counts.pop(player_id, None)
+        self.set(player_id, bitmap)
+        await self.flush(player_id)
+        return bitmap
+
+    async def reset(self, player_id: int):
+        """
+        Clear the bitmap of a player after their whole inventory was deleted.
+        """
+        self.notify(player_id)
+        self.counts.pop(player_id, None)
+        self.set(player_id, to_bitmap(self.pending_balls(player_id)))
+        await self.flush(player_id)
+
+    def forget(self, player_id: int):
+        """
+        Drop a deleted player, their bitmap is deleted with them.
+        """
+        self.notify(player_id)
+        self.bitmaps.pop(player_id, None)
+        self.dirty.pop(player_id, None)
+        self.counts.pop(player_id, None)
+
+    async def flush(self, *player_ids: int):
+        """
+        Write the modified bitmaps, or only the ones of the given players. On failure, they are
+        kept for the next flush.
+        """
+        if player_ids:
+            dirty = {x: self.dirty.pop(x) for x in player_ids if x in self.dirty}
+        else:
+            dirty, self.dirty = self.dirty, {}
+        if not dirty:
+            return
+        try:
+            try:
+                await self.write(dirty)
+            except IntegrityError:
+                # players deleted meanwhile
+                existing = set(
+                    await Player.filter(id__in=list(dirty)).values_list("id", flat=True)
+                )
+                await self.write({x: y for x, y in dirty.items() if x in existing})
+        except Exception:
+            log.exception("Failed to write %d owned balls bitmaps", len(dirty))
+            # unless modified again meanwhile
+            for player_id, bitmap in dirty.items():
+                self.dirty.setdefault(player_id, bitmap)
+
+    async def write(self, bitmaps: dict[int, int]):
+        await PlayerOwnedBalls.bulk_create(
+            [
+                PlayerOwnedBalls(
+                    player_id=player_id,
+                    bitmap=bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"),
+                )
+                for player_id, bitmap in bitmaps.items()
+            ],
+            update_fields=("bitmap",),
+            on_conflict=("player_id",),
+        )
+
+
+owned_balls = OwnedBallsCache()
+
+
+# Listeners of `BallInstance` for the processes that do not call the hooks, like the admin panel.
+# The persisted bitmaps of the affected players are deleted to be built again when next read.
+async def drop_previous_owned_balls(
+    model: Type[BallInstance],
+    instance: BallInstance,
+    using_db: "BaseDBAsyncClient | None" = None,
+    update_fields: Iterable[str] | None = None,
+):
+    if not instance._saved_in_db:
+        return
+    # the instance may be given to another player, the previous one is only known by the database
+    await PlayerOwnedBalls.filter(
+        player_id__in=Subquery(BallInstance.filter(pk=instance.pk).values("player_id"))
+    ).using_db(using_db).delete()
+
+
+async def drop_owned_balls(
+    model: Type[BallInstance],
+    instance: BallInstance,
+    created: bool,
+    using_db: "BaseDBAsyncClient | None" = None,
+    update_fields: Iterable[str] | None = None,
+):
+    await PlayerOwnedBalls.filter(player_id=instance.player_id).using_db(using_db).delete()
+
+
+async def drop_deleted_owned_balls(
+    model: Type[BallInstance],
+    instance: BallInstance,
+    using_db: "BaseDBAsyncClient | None" = None,
+):
+    await PlayerOwnedBalls.filter(player_id=instance.player_id).using_db(using_db).delete()
@@ -0,0 +1,60 @@
+from typing import Iterable
+
+import discord
+
+
+class MessageFilter:
+    """
+    Decides which messages are dispatched to the listeners, before any task is created for
+    them. Most messages come from guilds where nothing listens to them.
+
+    A message is dispatched if it comes from:
+
+    - a channel listened to by a cog (`channels`), whoever the author is
+    - a guild where spawning is enabled and that is not blacklisted, if not sent by a bot
+    - a bot owner, for text commands
+    - direct messages
+
+    Attributes
+    ----------
+    guilds: set[int]
+        Guilds where spawning is enabled, minus the blacklisted ones.
+    channels: set[int]
+        Channels with a dedicated listener.
+    """
+
+    def __init__(self):
+        self.guilds: set[int] = set()
+        self.channels: set[int] = set()
+        self.spawn_guilds: set[int] = set()
+        self.blacklist: set[int] = set()
+
+    def load(self, spawn_guilds: Iterable[int], blacklist: Iterable[int]):
+        self.spawn_guilds = set(spawn_guilds)
+        self.update_blacklist(blacklist)
+
+    def update_blacklist(self, blacklist: Iterable[int]):
+        self.blacklist = set(blacklist)
+        self.guilds = self.spawn_guilds - self.blacklist
+
+    def update_guild(self, guild_id: int, enabled: bool):
+        """
+        Update the filter after spawning is enabled or disabled in a guild.
+        """
+        if enabled:
+            self.spawn_guilds.add(guild_id)
+            if guild_id not in self.blacklist:
+                self.guilds.add(guild_id)
+        else:
+            self.spawn_guilds.discard(guild_id)
+            self.guilds.discard(guild_id)
+
+    def accepts(self, message: discord.Message, owner_ids: set[int]) -> bool:
+        if message.channel.id in self.channels:
+            return True
+        guild = message.guild
+        if guild is None:
+            return True
+        if message.author.bot:
+            return False
+        return guild.id in self.guilds or message.author.id in owner_ids
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-from concurrent.futures import ThreadPoolExecutor
+import logging
 from datetime import datetime, timedelta
 from enum import IntEnum
 from io import BytesIO
-from typing import TYPE_CHECKING, Iterable, Tuple, Type
+from typing import TYPE_CHECKING, Callable, Iterable, Tuple, Type
 
 import discord
 from discord.utils import format_dt
@@ -12,16 +12,89 @@ from fastapi_admin.models import AbstractAdmin
 from tortoise import exceptions, fields, models, signals, timezone, validators
 from tortoise.expressions import Q
 
-from ballsdex.core.image_generator.image_gen import draw_card
+from ballsdex.core.image_generator.cache import card_cache
+from ballsdex.core.image_generator.image_gen import (
+    DEFAULT_ENCODING,
+    CardEncoding,
+    CardSpec,
+    card_key,
+    clear_base_layers,
+    encode_card,
+)
+from ballsdex.core.utils.sampler import WeightedSampler
 
 if TYPE_CHECKING:
     from tortoise.backends.base.client import BaseDBAsyncClient
 
+log = logging.getLogger("ballsdex.core.models")
 
 balls: dict[int, Ball] = {}
 regimes: dict[int, Regime] = {}
 economies: dict[int, Economy] = {}
 specials: dict[int, Special] = {}
+# enabled balls weighted by rarity, rebuilt with the cache
+ball_sampler: WeightedSampler[Ball] = WeightedSampler()
+
+
+class CacheVersion:
+    """
+    Version of the model dicts above, incremented each time the bot reloads them.
+
+    Caches derived from the dicts either compare the version to know when they must be
+    rebuilt, or subscribe a callback, called synchronously right after the reload.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.subscribers: list[Callable[[], None]] = []
+
+    def subscribe(self, callback: Callable[[], None]) -> Callable[[], None]:
+        self.subscribers.append(callback)
+        return callback
+
+    def bump(self):
+        self.value += 1
+        for callback in self.subscribers:
+            try:
+                callback()
+            except Exception:
+                log.exception(f"Failed to refresh {callback!r} after a cache reload")
+
+
+cache_version = CacheVersion()
+cache_version.subscribe(clear_base_layers)
+
+
+@cache_version.subscribe
+def rebuild_ball_sampler():
+    enabled = [x for x in balls.values() if x.enabled]
+    ball_sampler.rebuild(enabled, (x.rarity for x in enabled))
+
+
+def swap_model_caches(
+    new_balls: dict[int, Ball],
+    new_regimes: dict[int, Regime],
+    new_economies: dict[int, Economy],
+    new_specials: dict[int, Special],
+):
+    """
+    Replace the content of the model dicts with the ones loaded beforehand, then bump the
+    cache version.
+
+    Nothing is awaited in between, so other tasks either see the old models or the new ones,
+    never empty or partially filled dicts. The dicts are updated in place since other modules
+    hold references to them, and keys are only removed once the new values are set.
+    """
+    for target, source in (
+        (balls, new_balls),
+        (regimes, new_regimes),
+        (economies, new_economies),
+        (specials, new_specials),
+    ):
+        target.update(source)
+        for key in target.keys() - source.keys():
+            del target[key]
+    cache_version.bump()
 
 
 async def lower_catch_names(
@@ -190,6 +263,22 @@ class Ball(models.Model):
 Ball.register_listener(signals.Signals.pre_save, lower_catch_names)
 Ball.register_listener(signals.Signals.pre_save, lower_translations)
 
+# SQL counterparts of the BallInstance.health and attack properties, for an instance aliased
+# INSTANCE_ALIAS joined with its ball aliased BALL_ALIAS, like the inventory paginator does.
+# Integer division truncates towards zero like int() does.
+# The stats depend on the ball, so they can neither be generated columns of the instance nor
+# indexed: sorting by them computes the stats of every instance of the player, found with the
+# (player_id, ball_id) index, and keeps the displayed page with a top-N sort.
+INSTANCE_ALIAS = "i"
+BALL_ALIAS = "b"
+INSTANCE_HEALTH_SQL = (
+    f'{BALL_ALIAS}."health" + {BALL_ALIAS}."health" * {INSTANCE_ALIAS}."health_bonus" / 100'
+)
+INSTANCE_ATTACK_SQL = (
+    f'{BALL_ALIAS}."attack" + {BALL_ALIAS}."attack" * {INSTANCE_ALIAS}."attack_bonus" / 100'
+)
+INSTANCE_TOTAL_STATS_SQL = f"{INSTANCE_HEALTH_SQL} + {INSTANCE_ATTACK_SQL}"
+
 
 class BallInstance(models.Model):
     ball_id: int
@@ -225,6 +314,7 @@ class BallInstance(models.Model):
 
     class Meta:
         unique_together = ("player", "id")
+        indexes = (("player_id", "ball_id"),)
 
     @property
     def is_tradeable(self) -> bool:
@@ -317,13 +407,23 @@ class BallInstance(models.Model):
                     text = f"{emoji} {text}"
         return text
 
-    def draw_card(self) -> BytesIO:
-        image = draw_card(self)
-        buffer = BytesIO()
-        image.save(buffer, format="png")
-        buffer.seek(0)
-        image.close()
-        return buffer
+    def draw_card(self, encoding: CardEncoding = DEFAULT_ENCODING, cached: bool = True) -> BytesIO:
+        """
+        Render the card synchronously, in the current thread. Use the bot's render pool in
+        asynchronous contexts instead.
+
+        With `cached=False`, the card, base layers and assets caches are bypassed. The caches
+        are keyed by path, this is needed when the files may have been replaced, like in the
+        admin panel.
+        """
+        spec = CardSpec.from_instance(self)
+        if not cached:
+            return BytesIO(encode_card(spec, encoding, cached=False))
+        key = card_key(spec, encoding)
+        if (data := card_cache.get(key)) is None:
+            data = encode_card(spec, encoding)
+            card_cache.put(key, data)
+        return BytesIO(data)
 
     async def prepare_for_message(
         self, interaction: discord.Interaction
@@ -364,10 +464,9 @@ class BallInstance(models.Model):
         )
 
         # draw image
-        with ThreadPoolExecutor() as pool:
-            buffer = await interaction.client.loop.run_in_executor(pool, self.draw_card)
-
-        return content, discord.File(buffer, "card.png")
+        render_pool = interaction.client.render_pool  # type: ignore
+        data = await render_pool.render(CardSpec.from_instance(self))
+        return content, discord.File(BytesIO(data), f"card.{render_pool.encoding.extension}")
 
     async def lock_for_trade(self):
         self.locked = timezone.now()
@@ -450,6 +549,21 @@ class Player(models.Model):
         return self.mention_policy == MentionPolicy.ALLOW
 
 
+# maintained by ballsdex.core.inventory
+class PlayerOwnedBalls(models.Model):
+    player_id: int
+
+    player: fields.OneToOneRelation[Player] = fields.OneToOneField(
+        "models.Player", on_delete=fields.CASCADE, related_name="owned_balls"
+    )
+    bitmap = fields.BinaryField(
+        description="Bit N is set if the player owns the ball of ID N, little-endian"
+    )
+
+    def __str__(self) -> str:
+        return str(self.pk)
+
+
 class BlacklistedID(models.Model):
     discord_id = fields.BigIntField(
         description="Discord user ID", unique=True, validators=[DiscordSnowflakeValidator()]
@@ -0,0 +1,89 @@
+import random
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Generic, Iterable, NamedTuple, Sequence, TypeVar
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+T = TypeVar("T")
+
+# below this, the overhead of building numpy arrays is higher than what it saves
+NUMPY_MIN_DRAWS = 32
+
+
+class _SamplerState(NamedTuple):
+    population: Sequence
+    cum_weights: list[float]
+    total: float
+    array: "numpy.ndarray | None"
+
+
+class WeightedSampler(Generic[T]):
+    """
+    Draw items at random with a probability proportional to their weight.
+
+    The cumulative weights are computed once, then each draw is a binary search. Batched draws
+    are vectorized with numpy if it is installed.
+
+    The state is replaced in a single assignment by `rebuild`, so draws happening concurrently
+    either see the old population or the new one, never a mix of both.
+
+    Parameters
+    ----------
+    population: Iterable[T]
+        The items to draw from.
+    weights: Iterable[float]
+        The weight of each item. Items with a weight of 0 or less are never drawn.
+    """
+
+    def __init__(self, population: Iterable[T] = (), weights: Iterable[float] = ()):
+        self._state = self._build(population, weights)
+
+    @staticmethod
+    def _build(population: Iterable[T], weights: Iterable[float]) -> _SamplerState:
+        items = [(item, weight) for item, weight in zip(population, weights) if weight > 0]
+        cum_weights = list(accumulate(weight for _, weight in items))
+        return _SamplerState(
+            population=tuple(item for item, _ in items),
+            cum_weights=cum_weights,
+            total=cum_weights[-1] if cum_weights else 0,
+            array=numpy.array(cum_weights) if numpy is not None and cum_weights else None,
+        )
+
+    def rebuild(self, population: Iterable[T], weights: Iterable[float]):
+        """
+        Replace the population and the weights.
+        """
+        self._state = self._build(population, weights)
+
+    def __len__(self) -> int:
+        return len(self._state.population)
+
+    def draw(self) -> T:
+        """
+        Draw a single item.
+        """
+        state = self._state
+        if not state.population:
+            raise IndexError("Cannot draw from an empty population")
+        index = bisect_right(state.cum_weights, random.random() * state.total)
+        # guard against floating point rounding on the last item
+        return state.population[min(index, len(state.population) - 1)]
+
+    def draw_many(self, k: int) -> list[T]:
+        """
+        Draw `k` items with replacement.
+        """
+        state = self._state
+        if not state.population:
+            raise IndexError("Cannot draw from an empty population")
+        if state.array is None or k < NUMPY_MIN_DRAWS:
+            return random.choices(state.population, cum_weights=state.cum_weights, k=k)
+        indexes = numpy.searchsorted(
+            state.array, numpy.random.random(k) * state.total, side="right"
+        )
+        numpy.minimum(indexes, len(state.population) - 1, out=indexes)
+        return [state.population[i] for i in indexes.tolist()]
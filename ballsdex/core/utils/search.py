@@ -0,0 +1,105 @@
+import heapq
+from collections import defaultdict
+from typing import Generic, Iterable, TypeVar
+
+T = TypeVar("T")
+
+# substrings up to this size are indexed, longer searches intersect them
+GRAM_SIZE = 3
+
+# relevance of a match, lower is better
+EXACT_MATCH = 0
+PREFIX_MATCH = 1
+WORD_PREFIX_MATCH = 2
+SUBSTRING_MATCH = 3
+
+
+class TokenIndex(Generic[T]):
+    """
+    Case-insensitive substring search over the names of a fixed set of items.
+
+    Every substring of up to `GRAM_SIZE` characters of the names is mapped to the items having
+    it. Short searches are a single lookup, longer ones intersect the items of their n-grams
+    and only check those candidates, instead of scanning every name.
+
+    Matches are ranked: exact names first, then names starting with the search, names with a
+    word starting with it, and finally any other match. Ties keep the order of the items.
+
+    Parameters
+    ----------
+    entries: Iterable[tuple[T, Iterable[str]]]
+        The items with their names, the first name being the displayed one.
+    """
+
+    def __init__(self, entries: Iterable[tuple[T, Iterable[str]]] = ()):
+        self.items: list[T] = []
+        self.names: list[tuple[str, ...]] = []
+        grams: defaultdict[str, set[int]] = defaultdict(set)
+        for i, (item, names) in enumerate(entries):
+            lowered = tuple(x.lower() for x in names if x)
+            self.items.append(item)
+            self.names.append(lowered)
+            for name in lowered:
+                for size in range(1, GRAM_SIZE + 1):
+                    for start in range(len(name) - size + 1):
+                        grams[name[start : start + size]].add(i)
+        self.grams: dict[str, set[int]] = dict(grams)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def candidates(self, value: str) -> Iterable[int]:
+        if len(value) <= GRAM_SIZE:
+            return self.grams.get(value, ())
+        sets: list[set[int]] = []
+        for start in range(len(value) - GRAM_SIZE + 1):
+            if (items := self.grams.get(value[start : start + GRAM_SIZE])) is None:
+                return ()
+            sets.append(items)
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    @staticmethod
+    def rank(names: tuple[str, ...], value: str) -> int | None:
+        best: int | None = None
+        for name in names:
+            if name == value:
+                return EXACT_MATCH
+            if name.startswith(value):
+                relevance = PREFIX_MATCH
+            elif any(x.startswith(value) for x in name.split()):
+                relevance = WORD_PREFIX_MATCH
+            elif value in name:
+                relevance = SUBSTRING_MATCH
+            else:
+                continue
+            if best is None or relevance < best:
+                best = relevance
+        return best
+
+    def search_ranked(self, value: str) -> list[tuple[int, T]]:
+        """
+        Return all the items matching the search with their relevance, best matches first.
+        """
+        value = value.lower()
+        if not value:
+            return [(SUBSTRING_MATCH, x) for x in self.items]
+        matches: list[tuple[int, int]] = []
+        for i in self.candidates(value):
+            if (relevance := self.rank(self.names[i], value)) is not None:
+                matches.append((relevance, i))
+        matches.sort()
+        return [(relevance, self.items[i]) for relevance, i in matches]
+
+    def search(self, value: str, limit: int = 25) -> list[T]:
+        """
+        Return the best `limit` items matching the search.
+        """
+        value = value.lower()
+        if not value:
+            return self.items[:limit]
+        matches: list[tuple[int, int]] = []
+        for i in self.candidates(value):
+            if (relevance := self.rank(self.names[i], value)) is not None:
+                matches.append((relevance, i))
+        return [self.items[i] for _, i in heapq.nsmallest(limit, matches)]
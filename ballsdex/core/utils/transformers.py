@@ -1,27 +1,37 @@
 import logging
+import re
 import time
 from datetime import timedelta
 from enum import Enum
-from typing import TYPE_CHECKING, Generic, Iterable, Optional, TypeVar
+from typing import TYPE_CHECKING, Any, Generic, Iterable, Optional, TypeVar
 
 import discord
+from cachetools import LRUCache, TTLCache
 from discord import app_commands
 from discord.interactions import Interaction
+from prometheus_client import Histogram
 from tortoise.exceptions import DoesNotExist
 from tortoise.expressions import Q, RawSQL
 from tortoise.models import Model
+from tortoise.queryset import QuerySet
 from tortoise.timezone import now as tortoise_now
 
+from ballsdex.core.caches import cache_lookups, player_cache
+from ballsdex.core.inventory import owned_balls
 from ballsdex.core.models import (
     Ball,
     BallInstance,
     Economy,
+    Player,
     Regime,
     Special,
     balls,
+    cache_version,
     economies,
     regimes,
+    specials,
 )
+from ballsdex.core.utils.search import EXACT_MATCH, PREFIX_MATCH, TokenIndex
 from ballsdex.settings import settings
 
 if TYPE_CHECKING:
@@ -30,6 +40,149 @@ if TYPE_CHECKING:
 log = logging.getLogger("ballsdex.core.utils.transformers")
 T = TypeVar("T", bound=Model)
 
+autocomplete_duration = Histogram(
+    "autocomplete_duration", "Time spent generating autocompletion choices", ["transformer"]
+)
+
+AUTOCOMPLETE_CACHE_SIZE = 10_000
+AUTOCOMPLETE_CACHE_TTL = 30
+# searches kept for each player, a few keystrokes of a couple of commands
+AUTOCOMPLETE_SEARCHES_PER_PLAYER = 16
+# instances fetched by a search, more than displayed so that longer searches can be refined
+AUTOCOMPLETE_CANDIDATES = 100
+
+HEX_ID_RE = re.compile(r"^[0-9a-f]{1,8}$")
+# upper bound of the SERIAL primary keys
+MAX_ID = 2**31 - 1
+
+
+def hex_prefix_ranges(prefix: str) -> list[tuple[int, int]]:
+    """
+    Return the ranges of IDs whose hexadecimal representation starts with the given prefix,
+    as (start, end) pairs with an excluded end. The longer representations are ranges of
+    consecutive IDs, a prefix search can then use the primary key index.
+    """
+    ranges: list[tuple[int, int]] = []
+    if prefix.startswith("0"):
+        return ranges  # hexadecimal IDs have no leading zero
+    start, end = int(prefix, 16), int(prefix, 16) + 1
+    while start <= MAX_ID:
+        start, end = start * 16, end * 16
+        if start <= MAX_ID:
+            ranges.append((start, min(end, MAX_ID + 1)))
+    return ranges
+
+
+def search_balls(value: str) -> dict[int, int]:
+    """
+    Find the balls whose names contain the search text, with the index of `ball_search`, which
+    must have been refreshed.
+
+    Returns
+    -------
+    dict[int, int]
+        The relevance of each matching ball ID: 1 for an exact name, 2 for a prefix and 4 for
+        any other match. Prefixes of instance IDs rank 3.
+    """
+    relevances: dict[int, int] = {}
+    for relevance, ball in ball_search.index.search_ranked(value):
+        if relevance == EXACT_MATCH:
+            relevances[ball.pk] = 1
+        elif relevance == PREFIX_MATCH:
+            relevances[ball.pk] = 2
+        else:
+            relevances[ball.pk] = 4
+    return relevances
+
+
+def match_instances(instances: Iterable[BallInstance], value: str) -> list[BallInstance]:
+    """
+    Filter and order instances in memory, like `BallInstanceTransformer.search` does in SQL.
+    """
+    relevances = search_balls(value)
+    is_hex = HEX_ID_RE.match(value) is not None
+    matches: list[tuple[int, BallInstance]] = []
+    for instance in instances:
+        if is_hex and f"{instance.pk:x}" == value:
+            matches.append((0, instance))
+        elif instance.ball_id in relevances:
+            matches.append((relevances[instance.ball_id], instance))
+        elif is_hex and f"{instance.pk:x}".startswith(value):
+            matches.append((3, instance))
+    matches.sort(key=lambda x: (x[0], -x[1].pk))
+    return [x for _, x in matches]
+
+
+class InstanceSearchCache:
+    """
+    Short-lived cache of the instances found by the countryball autocompletion, by player,
+    command filters and search text.
+
+    Discord sends an autocompletion for every keystroke. When the search for a prefix returned
+    all of its matches, a longer search is a refinement of it and is answered in memory. A
+    result truncated to `AUTOCOMPLETE_CANDIDATES` may miss matches of the longer search, which
+    is then queried again and cached, so the following keystrokes refine it once it fits.
+
+    Each player keeps their `AUTOCOMPLETE_SEARCHES_PER_PLAYER` most recent searches. Entries of
+    a player are dropped when their inventory changes, and expire after `ttl` seconds, which
+    bounds how long favorites may be outdated. The searches of the trade commands depend on
+    locks and are not cached.
+    """
+
+    def __init__(
+        self, max_size: int = AUTOCOMPLETE_CACHE_SIZE, ttl: float = AUTOCOMPLETE_CACHE_TTL
+    ):
+        self.searches: TTLCache[int, LRUCache[tuple[Any, ...], list[BallInstance]]] = TTLCache(
+            maxsize=max_size, ttl=ttl
+        )
+        owned_balls.listeners.append(self.invalidate)
+        # refined searches match the names of the balls
+        cache_version.subscribe(self.clear)
+
+    def __len__(self) -> int:
+        return len(self.searches)
+
+    def clear(self):
+        self.searches.clear()
+
+    def invalidate(self, player_id: int):
+        self.searches.pop(player_id, None)
+
+    def get(
+        self, player_id: int, filters: tuple[Any, ...], value: str
+    ) -> list[BallInstance] | None:
+        results = self.searches.get(player_id)
+        if results is None:
+            cache_lookups.labels(model="ballinstance_search", result="miss").inc()
+            return None
+        if (instances := results.get((filters, value))) is not None:
+            cache_lookups.labels(model="ballinstance_search", result="hit").inc()
+            return instances
+        # the longest cached prefix is the narrowest result, if it was truncated the shorter
+        # ones were too
+        for i in range(len(value) - 1, -1, -1):
+            candidates = results.get((filters, value[:i]))
+            if candidates is None:
+                continue
+            if len(candidates) >= AUTOCOMPLETE_CANDIDATES:
+                break
+            cache_lookups.labels(model="ballinstance_search", result="refined").inc()
+            instances = results[(filters, value)] = match_instances(candidates, value)
+            return instances
+        cache_lookups.labels(model="ballinstance_search", result="miss").inc()
+        return None
+
+    def set(
+        self, player_id: int, filters: tuple[Any, ...], value: str, instances: list[BallInstance]
+    ):
+        results = self.searches.get(player_id)
+        if results is None:
+            results = self.searches[player_id] = LRUCache(AUTOCOMPLETE_SEARCHES_PER_PLAYER)
+        results[(filters, value)] = instances
+
+
+instance_searches = InstanceSearchCache()
+
 __all__ = (
     "BallTransform",
     "BallInstanceTransform",
@@ -112,16 +265,8 @@ class ModelTransformer(app_commands.Transformer, Generic[T]):
     async def autocomplete(
         self, interaction: Interaction["BallsDexBot"], value: str
     ) -> list[app_commands.Choice[int]]:
-        t1 = time.time()
-        choices: list[app_commands.Choice[int]] = []
-        for option in await self.get_options(interaction, value):
-            choices.append(option)
-        t2 = time.time()
-        log.debug(
-            f"{self.name.title()} autocompletion took "
-            f"{round((t2 - t1) * 1000)}ms, {len(choices)} results"
-        )
-        return choices
+        with autocomplete_duration.labels(transformer=type(self).__name__).time():
+            return await self.get_options(interaction, value)
 
     async def transform(self, interaction: Interaction["BallsDexBot"], value: str) -> T | None:
         if not value:
@@ -161,13 +306,23 @@ class BallInstanceTransformer(ModelTransformer[BallInstance]):
     async def get_options(
         self, interaction: Interaction["BallsDexBot"], value: str
     ) -> list[app_commands.Choice[int]]:
-        balls_queryset = BallInstance.filter(player__discord_id=interaction.user.id)
-
+        # autocompletion must not create players, users without one have nothing to complete
+        player = player_cache.get(interaction.user.id)
+        if player is None:
+            player = await Player.get_or_none(discord_id=interaction.user.id)
+            if player is None:
+                return []
+            player_cache.update(player)
+        balls_queryset = BallInstance.filter(player_id=player.pk)
+
+        special_id: int | None = None
         if (special := getattr(interaction.namespace, "special", None)) and special.isdigit():
-            balls_queryset = balls_queryset.filter(special_id=int(special))
+            special_id = int(special)
+            balls_queryset = balls_queryset.filter(special_id=special_id)
         if (shiny := getattr(interaction.namespace, "shiny", None)) and shiny is not None:
             balls_queryset = balls_queryset.filter(shiny=shiny)
 
+        trade_type: TradeCommandType | None = None
         if interaction.command and (trade_type := interaction.command.extras.get("trade", None)):
             if trade_type == TradeCommandType.PICK:
                 balls_queryset = balls_queryset.filter(
@@ -180,24 +335,57 @@ class BallInstanceTransformer(ModelTransformer[BallInstance]):
                 balls_queryset = balls_queryset.filter(
                     locked__isnull=False, locked__gt=tortoise_now() - timedelta(minutes=30)
                 )
-        balls_queryset = (
-            balls_queryset.select_related("ball")
-            .annotate(
-                searchable=RawSQL(
-                    "to_hex(ballinstance.id) || ' ' || ballinstance__ball.country || "
-                    "' ' || ballinstance__ball.catch_names"
-                )
-            )
-            .filter(searchable__icontains=value.replace(".", ""))
-            .limit(25)
-        )
+        value = value.replace(".", "").strip().lower().removeprefix("#")
+        await ball_search.maybe_refresh()
+        if trade_type:
+            # locks change without notifying the cache, and expire with time
+            instances = await self.search(balls_queryset, value)
+        else:
+            filters = (special_id, bool(shiny))
+            instances = instance_searches.get(player.pk, filters, value)
+            if instances is None:
+                instances = await self.search(balls_queryset, value)
+                instance_searches.set(player.pk, filters, value, instances)
 
         choices: list[app_commands.Choice] = [
             app_commands.Choice(name=x.description(bot=interaction.client), value=str(x.pk))
-            for x in await balls_queryset
+            for x in instances[:25]
         ]
         return choices
 
+    async def search(
+        self, balls_queryset: QuerySet[BallInstance], value: str
+    ) -> list[BallInstance]:
+        """
+        Query the instances matching the search, ordered like `match_instances` does.
+        """
+        if value:
+            # names are matched in memory, the database only filters by ball and by ID, which
+            # is done with the (player_id, ball_id) and (player_id, id) indexes
+            relevances = search_balls(value)
+            queries = [Q(ball_id__in=list(relevances))] if relevances else []
+            exact_id = -1
+            if HEX_ID_RE.match(value):
+                exact_id = int(value, 16)
+                queries.append(Q(pk=exact_id))
+                queries.extend(
+                    Q(pk__gte=start, pk__lt=end) for start, end in hex_prefix_ranges(value)
+                )
+            if not queries:
+                return []
+            cases = [f'WHEN "ballinstance"."id" = {exact_id} THEN 0']
+            for relevance in sorted(set(relevances.values())):
+                ids = ",".join(str(x) for x, y in relevances.items() if y == relevance)
+                cases.append(f'WHEN "ballinstance"."ball_id" IN ({ids}) THEN {relevance}')
+            balls_queryset = (
+                balls_queryset.filter(Q(*queries, join_type=Q.OR))
+                .annotate(relevance=RawSQL(f"CASE {' '.join(cases)} ELSE 3 END"))
+                .order_by("relevance", "-id")
+            )
+        else:
+            balls_queryset = balls_queryset.order_by("-id")
+        return await balls_queryset.limit(AUTOCOMPLETE_CANDIDATES)
+
 
 class TTLModelTransformer(ModelTransformer[T]):
     """
@@ -206,20 +394,33 @@ class TTLModelTransformer(ModelTransformer[T]):
     This is used in most cases except for BallInstance which requires special handling depending
     on the interaction passed.
 
+    Items are searched with a `TokenIndex` over their `names`. It is only rebuilt when the
+    loaded items or their names changed.
+
     Attributes
     ----------
-    ttl: float
-        Delay in seconds for `items` to live until refreshed with `load_items`, defaults to 300
+    ttl: float | None
+        Delay in seconds for `items` to live until refreshed with `load_items`, defaults to 300.
+        `None` if the items come from the model dicts, they are then refreshed when the bot's
+        cache is reloaded.
     """
 
-    ttl: float = 300
+    ttl: float | None = 300
 
     def __init__(self):
         self.items: dict[int, T] = {}
-        self.search_map: dict[T, str] = {}
+        self.index: TokenIndex[T] = TokenIndex()
+        self.fingerprint: list[tuple[int, tuple[str, ...]]] = []
         self.last_refresh: float = 0
+        self.version = -1
         log.debug(f"Inited transformer for {self.name}")
 
+    def names(self, model: T) -> tuple[str, ...]:
+        """
+        Return the names an item can be searched with, defaults to `key`.
+        """
+        return (self.key(model),)
+
     async def load_items(self) -> Iterable[T]:
         """
         Query values to fill `items` with.
@@ -228,34 +429,47 @@ class TTLModelTransformer(ModelTransformer[T]):
 
     async def maybe_refresh(self):
         t = time.time()
-        if t - self.last_refresh > self.ttl:
-            self.items = {x.pk: x for x in await self.load_items()}
-            self.last_refresh = t
-            self.search_map = {x: self.key(x).lower() for x in self.items.values()}
+        if self.ttl is None:
+            if self.version == cache_version.value:
+                return
+        elif t - self.last_refresh <= self.ttl:
+            return
+        self.version = cache_version.value
+        self.last_refresh = t
+        items = {x.pk: x for x in await self.load_items()}
+        entries = [(x, self.names(x)) for x in items.values()]
+        fingerprint = [(x.pk, names) for x, names in entries]
+        self.items = items
+        if fingerprint != self.fingerprint:
+            self.index = TokenIndex(entries)
+            self.fingerprint = fingerprint
 
     async def get_options(
         self, interaction: Interaction["BallsDexBot"], value: str
     ) -> list[app_commands.Choice[str]]:
         await self.maybe_refresh()
-
-        i = 0
-        choices: list[app_commands.Choice] = []
-        for item in self.items.values():
-            if value.lower() in self.search_map[item]:
-                choices.append(app_commands.Choice(name=self.key(item), value=str(item.pk)))
-                i += 1
-                if i == 25:
-                    break
-        return choices
+        return [
+            app_commands.Choice(name=self.key(item), value=str(item.pk))
+            for item in self.index.search(value.strip(), 25)
+        ]
 
 
 class BallTransformer(TTLModelTransformer[Ball]):
     name = settings.collectible_name
     model = Ball()
+    ttl = None
 
     def key(self, model: Ball) -> str:
         return model.country
 
+    def names(self, model: Ball) -> tuple[str, ...]:
+        names = [model.country]
+        if model.catch_names:
+            names.extend(model.catch_names.split(";"))
+        if model.translations:
+            names.extend(model.translations.split(";"))
+        return tuple(names)
+
     async def load_items(self) -> Iterable[Ball]:
         return balls.values()
 
@@ -282,19 +496,24 @@ class BallEnabledTransformer(BallTransformer):
 class SpecialTransformer(TTLModelTransformer[Special]):
     name = "special event"
     model = Special()
+    ttl = None
 
     def key(self, model: Special) -> str:
         return model.name
 
+    async def load_items(self) -> Iterable[Special]:
+        return specials.values()
+
 
 class SpecialEnabledTransformer(SpecialTransformer):
     async def load_items(self) -> Iterable[Special]:
-        return await Special.filter(hidden=False).all()
+        return [x for x in specials.values() if not x.hidden]
 
 
 class RegimeTransformer(TTLModelTransformer[Regime]):
     name = "regime"
     model = Regime()
+    ttl = None
 
     def key(self, model: Regime) -> str:
         return model.name
@@ -306,6 +525,7 @@ class RegimeTransformer(TTLModelTransformer[Regime]):
 class EconomyTransformer(TTLModelTransformer[Economy]):
     name = "economy"
     model = Economy()
+    ttl = None
 
     def key(self, model: Economy) -> str:
         return model.name
@@ -314,6 +534,9 @@ class EconomyTransformer(TTLModelTransformer[Economy]):
         return economies.values()
 
 
+# names of all the balls, searched by the countryball autocompletion
+ball_search = BallTransformer()
+
 BallTransform = app_commands.Transform[Ball, BallTransformer]
 BallInstanceTransform = app_commands.Transform[BallInstance, BallInstanceTransformer]
 SpecialTransform = app_commands.Transform[Special, SpecialTransformer]
@@ -1,4 +1,3 @@
-import asyncio
 import datetime
 import logging
 import random
@@ -15,13 +14,14 @@ from discord.utils import format_dt
 from tortoise.exceptions import BaseORMException, DoesNotExist, IntegrityError
 from tortoise.expressions import Q
 
+from ballsdex.core.caches import guild_configs, player_cache
+from ballsdex.core.inventory import owned_balls
 from ballsdex.core.models import (
     Ball,
     BallInstance,
     BlacklistedGuild,
     BlacklistedID,
     BlacklistHistory,
-    GuildConfig,
     Player,
     Trade,
     TradeObject,
@@ -42,7 +42,9 @@ from ballsdex.core.utils.transformers import (
     SpecialTransform,
 )
 from ballsdex.packages.admin.menu import BlacklistViewFormat
+from ballsdex.packages.countryballs.batch import SpawnBatch
 from ballsdex.packages.countryballs.countryball import CountryBall
+from ballsdex.packages.countryballs.spawn import SpawnCooldown
 from ballsdex.packages.trade.display import TradeViewFormat, fill_trade_embed_fields
 from ballsdex.packages.trade.trade_user import TradingUser
 from ballsdex.settings import settings
@@ -217,6 +219,11 @@ class Admin(commands.GroupCog):
             "CountryBallsSpawner", self.bot.get_cog("CountryBallsSpawner")
         ).spawn_manager
         cooldown = spawn_manager.cooldowns.get(guild.id)
+        state = "active"
+        if not cooldown and (dormant := spawn_manager.dormant.get(guild.id)):
+            # only for display, the manager restores it on the next message
+            cooldown = SpawnCooldown.from_dormant(dormant)
+            state = "dormant (idle, the message cache was dropped)"
         if not cooldown:
             await interaction.response.send_message(
                 "No spawn manager could be found for that guild. Spawn may have been disabled.",
@@ -246,19 +253,15 @@ class Admin(commands.GroupCog):
         penalities: list[str] = []
         if guild.member_count < 5 or guild.member_count > 1000:
             penalities.append("Server has less than 5 or more than 1000 members")
-        if any(len(x.content) < 5 for x in cooldown.message_cache):
+        if cooldown.short_messages:
             penalities.append("Some cached messages are less than 5 characters long")
 
-        authors_set = set(x.author_id for x in cooldown.message_cache)
-        low_chatters = len(authors_set) < 4
+        low_chatters = len(cooldown.author_counts) < 4
         # check if one author has more than 40% of messages in cache
-        major_chatter = any(
-            (
-                len(list(filter(lambda x: x.author_id == author, cooldown.message_cache)))
-                / cooldown.message_cache.maxlen  # type: ignore
-                > 0.4
-            )
-            for author in authors_set
+        major_chatter = (
+            max(cooldown.author_counts.values(), default=0)
+            / cooldown.message_cache.maxlen  # type: ignore
+            > 0.4
         )
         # this mess is needed since either conditions make up to a single penality
         if low_chatters:
@@ -284,6 +287,7 @@ class Admin(commands.GroupCog):
 
         embed.description = (
             f"Manager initiated **{format_dt(cooldown.time, style='R')}**\n"
+            f"State: **{state}**\n"
             f"Initial number of points to reach: **{cooldown.chance}**\n"
             f"Message cache length: **{len(cooldown.message_cache)}**\n\n"
             f"Time-based multiplier: **x{multiplier}** *({range} members)*\n"
@@ -294,8 +298,13 @@ class Admin(commands.GroupCog):
         )
 
         informations: list[str] = []
-        if cooldown.lock.locked():
+        if cooldown.on_cooldown(interaction.created_at):
             informations.append("The manager is currently on cooldown.")
+        if spawn_manager.scheduler and guild.id in spawn_manager.scheduler.queued:
+            informations.append(
+                f"A {settings.collectible_name} is queued and will spawn shortly "
+                f"({len(spawn_manager.scheduler)} spawns queued in total)."
+            )
         if delta < 600:
             informations.append(
                 f"The manager is less than 10 minutes old, {settings.plural_collectible_name} "
@@ -306,6 +315,12 @@ class Admin(commands.GroupCog):
                 name="\N{INFORMATION SOURCE}\N{VARIATION SELECTOR-16} Informations",
                 value="- " + "\n- ".join(informations),
             )
+        embed.set_footer(
+            text=f"Spawn manager: {len(spawn_manager.cooldowns)} active and "
+            f"{len(spawn_manager.dormant)} dormant servers, "
+            f"~{spawn_manager.memory_usage() / 1024 / 1024:.1f}MB. Idle servers are compacted "
+            f"after {settings.spawn_idle_ttl} minutes."
+        )
 
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -369,7 +384,7 @@ class Admin(commands.GroupCog):
 
         entries: list[tuple[str, str]] = []
         for guild in guilds:
-            if config := await GuildConfig.get_or_none(guild_id=guild.id):
+            if config := guild_configs.get(guild.id):
                 spawn_enabled = config.enabled and config.guild_id
             else:
                 spawn_enabled = False
@@ -429,67 +444,51 @@ class Admin(commands.GroupCog):
         channel: discord.TextChannel,
         n: int,
     ):
-        spawned = 0
+        batch = await SpawnBatch.draw([channel], n, countryball)
+
+        async def update_message(batch: SpawnBatch):
+            await interaction.followup.edit_message(
+                "@original",  # type: ignore
+                content=f"Spawn bomb in progress in {channel.mention}, "
+                f"{settings.collectible_name.title()}: {countryball or 'Random'}\n"
+                f"{batch.spawned}/{n} spawned ({round((batch.spawned / n) * 100)}%)",
+            )
+
+        await interaction.response.send_message(
+            f"Starting spawn bomb in {channel.mention}...", ephemeral=True
+        )
+        await batch.run(update_message)
+        if batch.failed:
+            await interaction.followup.edit_message(
+                "@original",  # type: ignore
+                content=f"{batch.spawned}/{n} {settings.plural_collectible_name} spawned. "
+                f"A {settings.collectible_name} failed to spawn, probably "
+                "indicating a lack of permissions to send messages "
+                f"or upload files in {channel.mention}.",
+            )
+            return
+        await interaction.followup.edit_message(
+            "@original",  # type: ignore
+            content=f"Successfully spawned {batch.spawned} {settings.plural_collectible_name} "
+            f"in {channel.mention} in {batch.elapsed:.0f}s!",
+        )
 
     @app_commands.command()
     @app_commands.checks.has_any_role(*settings.root_role_ids)
     async def echo(
-        self, 
+        self,
         interaction: discord.Interaction["BallsDexBot"],
         message: str,
         channel: discord.TextChannel | None = None,
     ):
+        #  Thanks to DotZZ for making this command
         send_channel = channel
 
         if send_channel is None:
             send_channel = cast(discord.TextChannel, interaction.channel)
-      
-        await interaction.response.send_message("Sent echo message!", ephemeral = True)
-        await send_channel.send(message)
-        #  Thanks to DotZZ for making this command
-        async def update_message_loop():
-            nonlocal spawned
-            for i in range(5 * 12 * 10):  # timeout progress after 10 minutes
-                await interaction.followup.edit_message(
-                    "@original",  # type: ignore
-                    content=f"Spawn bomb in progress in {channel.mention}, "
-                    f"{settings.collectible_name.title()}: {countryball or 'Random'}\n"
-                    f"{spawned}/{n} spawned ({round((spawned / n) * 100)}%)",
-                )
-                await asyncio.sleep(5)
-            await interaction.followup.edit_message(
-                "@original", content="Spawn bomb seems to have timed out."  # type: ignore
-            )
 
-        await interaction.response.send_message(
-            f"Starting spawn bomb in {channel.mention}...", ephemeral=True
-        )
-        task = self.bot.loop.create_task(update_message_loop())
-        try:
-            for i in range(n):
-                if not countryball:
-                    ball = await CountryBall.get_random()
-                else:
-                    ball = CountryBall(countryball)
-                result = await ball.spawn(channel)
-                if not result:
-                    task.cancel()
-                    await interaction.followup.edit_message(
-                        "@original",  # type: ignore
-                        content=f"A {settings.collectible_name} failed to spawn, probably "
-                        "indicating a lack of permissions to send messages "
-                        f"or upload files in {channel.mention}.",
-                    )
-                    return
-                spawned += 1
-            task.cancel()
-            await interaction.followup.edit_message(
-                "@original",  # type: ignore
-                content=f"Successfully spawned {spawned} {settings.plural_collectible_name} "
-                f"in {channel.mention}!",
-            )
-        finally:
-            task.cancel()
+        await interaction.response.send_message("Sent echo message!", ephemeral=True)
+        await send_channel.send(message)
 
     @balls.command()
     @app_commands.checks.has_any_role(*settings.root_role_ids)
@@ -591,8 +590,8 @@ class Admin(commands.GroupCog):
             return
         await interaction.response.defer(ephemeral=True, thinking=True)
 
-        player, created = await Player.get_or_create(discord_id=user.id)
-        instance = await BallInstance.create(
+        player = await player_cache.get_or_create(user.id)
+        instance, _ = await self.bot.catch_queue.create(
             ball=countryball,
             player=player,
             shiny=(shiny if shiny is not None else random.randint(1, 2048) == 1),
@@ -894,6 +893,7 @@ class Admin(commands.GroupCog):
             )
         else:
             self.bot.blacklist_guild.add(guild.id)
+            self.bot.message_filter.update_blacklist(self.bot.blacklist_guild)
             await interaction.response.send_message("Guild is now blacklisted.", ephemeral=True)
         await log_action(
             f"{interaction.user} blacklisted the guild {guild}({guild.id}) "
@@ -949,6 +949,7 @@ class Admin(commands.GroupCog):
                 action_type="unblacklist",
             )
             self.bot.blacklist_guild.remove(guild.id)
+            self.bot.message_filter.update_blacklist(self.bot.blacklist_guild)
             await interaction.response.send_message(
                 "Guild is now removed from blacklist.", ephemeral=True
             )
@@ -1093,6 +1094,7 @@ class Admin(commands.GroupCog):
             )
             return
         await ball.delete()
+        await owned_balls.update(ball.player_id, lost=[ball.ball_id])
         await interaction.response.send_message(
             f"{settings.collectible_name.title()} {countryball_id} deleted.", ephemeral=True
         )
@@ -1128,9 +1130,11 @@ class Admin(commands.GroupCog):
                 f"The {settings.collectible_name} ID you gave does not exist.", ephemeral=True
             )
             return
-        player, _ = await Player.get_or_create(discord_id=user.id)
+        player = await player_cache.get_or_create(user.id)
         ball.player = player
         await ball.save()
+        await owned_balls.update(original_player.pk, lost=[ball.ball_id])
+        await owned_balls.update(player.pk, gained=[ball.ball_id])
 
         trade = await Trade.create(player1=original_player, player2=player)
         await TradeObject.create(trade=trade, ballinstance=ball, player=original_player)
@@ -1193,8 +1197,10 @@ class Admin(commands.GroupCog):
             for ball in to_delete:
                 await ball.delete()
             count = len(to_delete)
+            await owned_balls.update(player.pk, lost=[x.ball_id for x in to_delete])
         else:
             count = await BallInstance.filter(player=player).delete()
+            await owned_balls.reset(player.pk)
         await interaction.followup.send(
             f"{count} {settings.plural_collectible_name} from {user} have been deleted.",
             ephemeral=True,
@@ -1651,7 +1657,7 @@ class Admin(commands.GroupCog):
                 )
                 return
 
-        if config := await GuildConfig.get_or_none(guild_id=guild.id):
+        if config := guild_configs.get(guild.id):
             spawn_enabled = config.enabled and config.guild_id
         else:
             spawn_enabled = False
@@ -1,6 +1,6 @@
 import enum
 import logging
-from collections import defaultdict
+from collections import Counter
 from typing import TYPE_CHECKING
 
 import discord
@@ -9,7 +9,19 @@ from discord.ext import commands
 from discord.ui import Button, View, button
 from tortoise.exceptions import DoesNotExist
 
-from ballsdex.core.models import BallInstance, DonationPolicy, Player, Trade, TradeObject, balls
+from ballsdex.core.caches import player_cache
+from ballsdex.core.inventory import owned_balls
+from ballsdex.core.models import (
+    INSTANCE_ATTACK_SQL,
+    INSTANCE_HEALTH_SQL,
+    INSTANCE_TOTAL_STATS_SQL,
+    BallInstance,
+    DonationPolicy,
+    Player,
+    Trade,
+    TradeObject,
+    balls,
+)
 from ballsdex.core.utils.buttons import ConfirmChoiceView
 from ballsdex.core.utils.paginator import FieldPageSource, Pages
 from ballsdex.core.utils.transformers import (
@@ -19,7 +31,11 @@ from ballsdex.core.utils.transformers import (
     TradeCommandType,
 )
 from ballsdex.core.utils.utils import inventory_privacy, is_staff
-from ballsdex.packages.balls.countryballs_paginator import CountryballsViewer
+from ballsdex.packages.balls.countryballs_paginator import (
+    CountryballsViewer,
+    InventorySource,
+    SortKey,
+)
 from ballsdex.settings import settings
 
 if TYPE_CHECKING:
@@ -72,6 +88,8 @@ class DonationRequest(View):
         self.countryball.trade_player = self.countryball.player
         self.countryball.player = self.new_player
         await self.countryball.save()
+        await owned_balls.update(self.countryball.trade_player_id, lost=[self.countryball.ball_id])
+        await owned_balls.update(self.new_player.pk, gained=[self.countryball.ball_id])
         trade = await Trade.create(player1=self.countryball.trade_player, player2=self.new_player)
         await TradeObject.create(
             trade=trade, ballinstance=self.countryball, player=self.countryball.trade_player
@@ -110,12 +128,41 @@ class SortingChoices(enum.Enum):
     attack_bonus = "-attack_bonus"
     stats_bonus = "stats"
     total_stats = "total_stats"
-
-    # manual sorts are not sorted by SQL queries but by our code
-    # this may be do-able with SQL still, but I don't have much experience ngl
     duplicates = "manualsort-duplicates"
 
 
+SORT_KEYS: dict[SortingChoices | None, SortKey] = {
+    None: SortKey(('i."favorite"', 'i."shiny"'), descending=True),
+    SortingChoices.alphabetic: SortKey(('b."country"',)),
+    SortingChoices.catch_date: SortKey(('i."catch_date"',), descending=True),
+    SortingChoices.rarity: SortKey(('b."rarity"', 'b."country"')),
+    # instances without a special come last
+    SortingChoices.special: SortKey(('COALESCE(i."special_id", 2147483647)',)),
+    SortingChoices.health: SortKey((INSTANCE_HEALTH_SQL,), descending=True),
+    SortingChoices.attack: SortKey((INSTANCE_ATTACK_SQL,), descending=True),
+    SortingChoices.health_bonus: SortKey(('i."health_bonus"',), descending=True),
+    SortingChoices.attack_bonus: SortKey(('i."attack_bonus"',), descending=True),
+    SortingChoices.stats_bonus: SortKey(('i."health_bonus" + i."attack_bonus"',), descending=True),
+    SortingChoices.total_stats: SortKey((INSTANCE_TOTAL_STATS_SQL,), descending=True),
+    # most owned balls first, grouped by ball
+    # only used with a special filter, otherwise see duplicates_sort_key
+    SortingChoices.duplicates: SortKey(
+        ('-COUNT(*) OVER (PARTITION BY i."ball_id")', 'i."ball_id"')
+    ),
+}
+
+
+def duplicates_sort_key(counts: Counter[int]) -> SortKey:
+    """
+    Sort by duplicates using the cached counts of the player, instead of counting the whole
+    inventory in the query. The rank of each ball is passed as an array indexed by ball ID.
+    """
+    ranks: list[int | None] = [None] * max(counts, default=0)
+    for rank, ball_id in enumerate(sorted(counts, key=lambda x: (-counts[x], x))):
+        ranks[ball_id - 1] = rank
+    return SortKey(('COALESCE(({0}::int[])[i."ball_id"], 2147483647)',), params=(ranks,))
+
+
 class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
     """
     View and manage your countryballs collection.
@@ -178,36 +225,13 @@ class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
             )
             return
 
-        await player.fetch_related("balls")
         filters = {"ball__id": countryball.pk} if countryball else {}
         if special:
             filters["special"] = special
-        if sort:
-            if sort == SortingChoices.duplicates:
-                countryballs = await player.balls.filter(**filters)
-                count = defaultdict(int)
-                for ball in countryballs:
-                    count[ball.countryball.pk] += 1
-                countryballs.sort(key=lambda m: (-count[m.countryball.pk], m.countryball.pk))
-            elif sort == SortingChoices.stats_bonus:
-                countryballs = await player.balls.filter(**filters)
-                countryballs.sort(key=lambda x: x.health_bonus + x.attack_bonus, reverse=True)
-            elif sort == SortingChoices.health or sort == SortingChoices.attack:
-                countryballs = await player.balls.filter(**filters)
-                countryballs.sort(key=lambda x: getattr(x, sort.value), reverse=True)
-            elif sort == SortingChoices.total_stats:
-                countryballs = await player.balls.filter(**filters)
-                countryballs.sort(key=lambda x: x.health + x.attack, reverse=True)
-            elif sort == SortingChoices.rarity:
-                countryballs = await player.balls.filter(**filters).order_by(
-                    sort.value, "ball__country"
-                )
-            else:
-                countryballs = await player.balls.filter(**filters).order_by(sort.value)
-        else:
-            countryballs = await player.balls.filter(**filters).order_by("-favorite", "-shiny")
+        # only the displayed pages are fetched, sorted by the database
+        count = await BallInstance.filter(player=player, **filters).count()
 
-        if len(countryballs) < 1:
+        if count < 1:
             ball_txt = countryball.country if countryball else ""
             special_txt = special if special else ""
 
@@ -230,10 +254,18 @@ class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
                     f"{settings.plural_collectible_name} yet."
                 )
             return
-        if reverse:
-            countryballs.reverse()
-
-        paginator = CountryballsViewer(interaction, countryballs)
+        if sort == SortingChoices.duplicates and special is None:
+            sort_key = duplicates_sort_key(await owned_balls.get_counts(player.pk))
+        else:
+            sort_key = SORT_KEYS[sort]
+        source = InventorySource(
+            player.pk,
+            count,
+            sort_key.reverse() if reverse else sort_key,
+            ball_id=countryball.pk if countryball else None,
+            special=special,
+        )
+        paginator = CountryballsViewer(interaction, source)
         if user_obj == interaction.user:
             await paginator.start()
         else:
@@ -286,6 +318,8 @@ class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
 
             if await inventory_privacy(self.bot, interaction, player, user_obj) is False:
                 return
+        else:
+            player = await player_cache.get_or_create(user_obj.id)
         # Filter disabled balls, they do not count towards progression
         # Only ID and emoji is interesting for us
         bot_countryballs = {x: y.emoji_id for x, y in balls.items() if y.enabled}
@@ -307,14 +341,19 @@ class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
             )
             return
 
-        if shiny is not None:
-            filters["shiny"] = shiny
-        owned_countryballs = set(
-            x[0]
-            for x in await BallInstance.filter(**filters)
-            .distinct()  # Do not query everything
-            .values_list("ball_id")
-        )
+        if special is None and shiny is None:
+            # answered by the bitmap of owned balls, without reading the inventory
+            bitmap = await owned_balls.get(player.pk)
+            owned_countryballs = set(x for x in bot_countryballs if bitmap >> x & 1)
+        else:
+            if shiny is not None:
+                filters["shiny"] = shiny
+            owned_countryballs = set(
+                x[0]
+                for x in await BallInstance.filter(**filters)
+                .distinct()  # Do not query everything
+                .values_list("ball_id")
+            )
 
         entries: list[tuple[str, str]] = []
 
@@ -578,7 +617,7 @@ class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
         else:
             await interaction.response.defer()
         await countryball.lock_for_trade()
-        new_player, _ = await Player.get_or_create(discord_id=user.id)
+        new_player = await player_cache.get_or_create(user.id)
         old_player = countryball.player
 
         if new_player == old_player:
@@ -631,6 +670,8 @@ class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
         countryball.trade_player = old_player
         countryball.favorite = False
         await countryball.save()
+        await owned_balls.update(old_player.pk, lost=[countryball.ball_id])
+        await owned_balls.update(new_player.pk, gained=[countryball.ball_id])
 
         trade = await Trade.create(player1=old_player, player2=new_player)
         await TradeObject.create(trade=trade, ballinstance=countryball, player=old_player)
@@ -671,18 +712,24 @@ class Balls(commands.GroupCog, group_name=settings.players_group_cog_name):
         if interaction.response.is_done():
             return
         assert interaction.guild
-        filters = {}
-        if countryball:
-            filters["ball"] = countryball
-        if shiny is not None:
-            filters["shiny"] = shiny
-        if special:
-            filters["special"] = special
-        if current_server:
-            filters["server_id"] = interaction.guild.id
-        filters["player__discord_id"] = interaction.user.id
         await interaction.response.defer(ephemeral=True, thinking=True)
-        balls = await BallInstance.filter(**filters).count()
+        if special is None and shiny is None and not current_server:
+            # answered by the cached counts, without counting the inventory
+            player = await player_cache.get_or_create(interaction.user.id)
+            counts = await owned_balls.get_counts(player.pk)
+            balls = counts[countryball.pk] if countryball else counts.total()
+        else:
+            filters = {}
+            if countryball:
+                filters["ball"] = countryball
+            if shiny is not None:
+                filters["shiny"] = shiny
+            if special:
+                filters["special"] = special
+            if current_server:
+                filters["server_id"] = interaction.guild.id
+            filters["player__discord_id"] = interaction.user.id
+            balls = await BallInstance.filter(**filters).count()
         country = f"{countryball.country} " if countryball else ""
         plural = "s" if balls > 1 or balls == 0 else ""
         shiny_str = "shiny " if shiny else ""
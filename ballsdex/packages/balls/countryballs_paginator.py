@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, List
 
 import discord
 
-from ballsdex.core.models import BallInstance
+from ballsdex.core.models import BALL_ALIAS, INSTANCE_ALIAS, BallInstance, Special
 from ballsdex.core.utils import menus
 from ballsdex.core.utils.paginator import Pages
 
@@ -12,6 +14,40 @@ if TYPE_CHECKING:
     from ballsdex.core.bot import BallsDexBot
 
 
+# table aliases of InventorySource.base_query, the stat expressions of the models use them too
+QUERY_ALIASES = {"i", "b"}
+assert {INSTANCE_ALIAS, BALL_ALIAS} == QUERY_ALIASES, "The stat expressions use other aliases"
+# table aliases referenced by an SQL expression, like i in i."ball_id"
+ALIAS_RE = re.compile(r'\b(\w+)\."')
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """
+    How an inventory is ordered, as SQL expressions over the instance (`i`) and its ball (`b`).
+    All the expressions are sorted in the same direction, the ID of the instance is added as
+    the last key to make the order total.
+
+    Expressions may refer to query parameters with `{0}`, `{1}`... the values are taken from
+    `params`.
+
+    No sort is backed by an index, only the filters on the player and the ball are. Every
+    matching instance is read, and the page is kept with a top-N sort.
+    """
+
+    expressions: tuple[str, ...]
+    descending: bool = False
+    params: tuple[Any, ...] = ()
+
+    def __post_init__(self):
+        for expression in self.expressions:
+            aliases = set(ALIAS_RE.findall(expression))
+            assert aliases <= QUERY_ALIASES, f"Unknown table in {expression!r}"
+
+    def reverse(self) -> SortKey:
+        return SortKey(self.expressions, not self.descending, self.params)
+
+
 class CountryballsSource(menus.ListPageSource):
     def __init__(self, entries: List[BallInstance]):
         super().__init__(entries, per_page=25)
@@ -21,10 +57,114 @@ class CountryballsSource(menus.ListPageSource):
         return True  # signal to edit the page
 
 
+class InventorySource(menus.PageSource):
+    """
+    Pages of a player's inventory, read from the database when displayed instead of loading
+    every instance.
+
+    Pages are fetched with keyset pagination: the sort key of the last row of a page is kept,
+    and the next page starts right after it. Jumping to a page that was not reached yet falls
+    back to an offset.
+
+    Parameters
+    ----------
+    player_id: int
+        Primary key of the player.
+    count: int
+        Number of instances matching the filters, from a count query.
+    sort: SortKey
+        Order of the instances.
+    ball_id: int | None
+        Only show instances of this ball.
+    special: Special | None
+        Only show instances of this special.
+    """
+
+    def __init__(
+        self,
+        player_id: int,
+        count: int,
+        sort: SortKey,
+        *,
+        ball_id: int | None = None,
+        special: Special | None = None,
+        per_page: int = 25,
+    ):
+        self.count = count
+        self.per_page = per_page
+        self.descending = sort.descending
+        # sort key of the last row of the previous page, by page number
+        self.cursors: dict[int, tuple[Any, ...]] = {}
+
+        self.params: list[Any] = [player_id, *sort.params]
+        placeholders = [f"${i + 2}" for i in range(len(sort.params))]
+        self.keys = (*(x.format(*placeholders) for x in sort.expressions), 'i."id"')
+        conditions = ['i."player_id" = $1']
+        if ball_id is not None:
+            self.params.append(ball_id)
+            conditions.append(f'i."ball_id" = ${len(self.params)}')
+        if special is not None:
+            self.params.append(special.pk)
+            conditions.append(f'i."special_id" = ${len(self.params)}')
+        columns = ", ".join(f'{x} AS "k{i}"' for i, x in enumerate(self.keys))
+        # keys are computed in a subquery, window functions cannot be filtered on directly
+        self.base_query = (
+            f'SELECT * FROM (SELECT i.*, {columns} FROM "ballinstance" i '
+            f'JOIN "ball" b ON b."id" = i."ball_id" WHERE {" AND ".join(conditions)}) t'
+        )
+
+    def is_paginating(self) -> bool:
+        return self.count > self.per_page
+
+    def get_max_pages(self) -> int:
+        return max(1, -(-self.count // self.per_page))
+
+    async def fetch(
+        self, after: tuple[Any, ...] | None = None, offset: int = 0
+    ) -> list[dict[str, Any]]:
+        params = list(self.params)
+        query = self.base_query
+        names = [f'"k{i}"' for i in range(len(self.keys))]
+        if after is not None:
+            placeholders = ", ".join(f"${len(params) + i + 1}" for i in range(len(after)))
+            params.extend(after)
+            operator = "<" if self.descending else ">"
+            query += f" WHERE ({', '.join(names)}) {operator} ({placeholders})"
+        direction = " DESC" if self.descending else ""
+        query += " ORDER BY " + ", ".join(x + direction for x in names)
+        query += f" LIMIT {self.per_page}"
+        if offset:
+            query += f" OFFSET {offset}"
+        return await BallInstance._meta.db.execute_query_dict(query, params)
+
+    async def get_page(self, page_number: int) -> List[BallInstance]:
+        if page_number == 0:
+            rows = await self.fetch()
+        elif (after := self.cursors.get(page_number)) is not None:
+            rows = await self.fetch(after=after)
+        else:
+            rows = await self.fetch(offset=page_number * self.per_page)
+        if rows:
+            last = rows[-1]
+            self.cursors[page_number + 1] = tuple(last[f"k{i}"] for i in range(len(self.keys)))
+        return [BallInstance._init_from_db(**row) for row in rows]
+
+    async def format_page(self, menu: CountryballsSelector, balls: List[BallInstance]):
+        menu.set_options(balls)
+        return True  # signal to edit the page
+
+
 class CountryballsSelector(Pages):
-    def __init__(self, interaction: discord.Interaction["BallsDexBot"], balls: List[BallInstance]):
+    def __init__(
+        self,
+        interaction: discord.Interaction["BallsDexBot"],
+        balls: List[BallInstance] | menus.PageSource,
+    ):
         self.bot = interaction.client
-        source = CountryballsSource(balls)
+        if isinstance(balls, menus.PageSource):
+            source = balls
+        else:
+            source = CountryballsSource(balls)
         super().__init__(source, interaction=interaction)
         self.add_item(self.select_ball_menu)
 
@@ -11,10 +11,10 @@ from discord.ext import commands
 import asyncio
 import io
 
+from ballsdex.core.caches import player_cache
 from ballsdex.core.models import (
     Ball,
     BallInstance,
-    Player
 )
 from ballsdex.core.models import balls as countryballs
 from ballsdex.settings import settings
@@ -450,7 +450,7 @@ class Battle(commands.GroupCog):
         """
         Add countryballs to a battle in bulk.
         """
-        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         balls = await countryball.ballinstances.filter(player=player)
 
         count = 0
@@ -470,7 +470,7 @@ class Battle(commands.GroupCog):
         """
         Add all your countryballs to a battle.
         """
-        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         balls = await BallInstance.filter(player=player)
 
         count = 0
@@ -490,7 +490,7 @@ class Battle(commands.GroupCog):
         """
         Remove all your countryballs from a battle.
         """
-        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         balls = await BallInstance.filter(player=player)
 
         count = 0
@@ -510,7 +510,7 @@ class Battle(commands.GroupCog):
         """
         Remove countryballs from a battle in bulk.
         """
-        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         balls = await countryball.ballinstances.filter(player=player)
 
         count = 0
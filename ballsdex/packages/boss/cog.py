@@ -16,6 +16,7 @@ from ballsdex.core.utils.transformers import BallEnabledTransform
 from ballsdex.core.utils.transformers import SpecialTransform, BallTransform
 from ballsdex.core.utils.paginator import FieldPageSource, Pages
 from ballsdex.core.utils.logging import log_action
+from ballsdex.core.caches import player_cache
 from ballsdex.settings import settings
 
 if TYPE_CHECKING:
@@ -26,11 +27,9 @@ FILENAME_RE = re.compile(r"^(.+)(\.\S+)$")
 
 from ballsdex.core.models import (
     Ball,
-    BallInstance,
     BlacklistedGuild,
     BlacklistedID,
     GuildConfig,
-    Player,
     Trade,
     TradeObject,
     balls,
@@ -327,9 +326,9 @@ class Boss(commands.GroupCog):
             return await interaction.response.send_message(f"BOSS HAS CONCLUDED\nThe boss has won the Boss Battle!")
         if do_not_reward == False:
             await interaction.response.defer(thinking=True)
-            player, created = await Player.get_or_create(discord_id=bosswinner)
+            player = await player_cache.get_or_create(bosswinner)
             special = special = [x for x in specials.values() if x.name == "Boss"][0]
-            instance = await BallInstance.create(
+            instance, _ = await self.bot.catch_queue.create(
                 ball=self.bossball,
                 player=player,
                 shiny=False,
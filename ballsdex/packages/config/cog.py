@@ -4,7 +4,7 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-from ballsdex.core.models import GuildConfig
+from ballsdex.core.caches import guild_configs
 from ballsdex.packages.config.components import AcceptTOSView
 from ballsdex.settings import settings
 
@@ -92,7 +92,7 @@ class Config(commands.GroupCog):
         Disable or enable countryballs spawning.
         """
         guild = cast(discord.Guild, interaction.guild)  # guild-only command
-        config, created = await GuildConfig.get_or_create(guild_id=interaction.guild_id)
+        config = await guild_configs.get_or_create(guild.id)
         if config.enabled:
             config.enabled = False  # type: ignore
             await config.save()
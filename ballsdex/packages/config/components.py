@@ -3,7 +3,7 @@ from typing import Optional
 import discord
 from discord.ui import Button, View, button
 
-from ballsdex.core.models import GuildConfig
+from ballsdex.core.caches import guild_configs
 from ballsdex.settings import settings
 
 
@@ -55,7 +55,7 @@ class AcceptTOSView(View):
         emoji="\N{HEAVY CHECK MARK}\N{VARIATION SELECTOR-16}",
     )
     async def accept_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        config, created = await GuildConfig.get_or_create(guild_id=interaction.guild_id)
+        config = await guild_configs.get_or_create(interaction.guild_id)  # type: ignore
         config.spawn_channel = self.channel.id  # type: ignore
         config.silent = self.silent
         await config.save()
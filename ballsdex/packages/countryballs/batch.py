@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable, Sequence
+
+import discord
+
+from ballsdex.core.models import Ball
+from ballsdex.packages.countryballs.countryball import CountryBall
+
+log = logging.getLogger("ballsdex.packages.countryballs.batch")
+
+# Discord allows 5 messages every 5 seconds per channel for bots
+CHANNEL_RATE = 5
+CHANNEL_PER = 5.0
+# maximum number of messages being sent at the same time, across all channels
+MAX_CONCURRENCY = 10
+
+
+class TokenBucket:
+    """
+    Async token bucket, allowing `rate` acquisitions every `per` seconds with bursts of up
+    to `rate`.
+    """
+
+    def __init__(self, rate: int = CHANNEL_RATE, per: float = CHANNEL_PER):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.rate, self.tokens + (now - self.updated) * self.rate / self.per
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class SpawnBatch:
+    """
+    Spawn many countryballs at once, in one or more channels.
+
+    Messages are paced per channel to stay under Discord's rate limit instead of hitting it
+    and waiting for the retry, and the channels are served concurrently. If a spawn fails in a
+    channel, which usually means missing permissions, the remaining spawns of that channel are
+    skipped.
+
+    Parameters
+    ----------
+    jobs: Iterable[tuple[discord.TextChannel, CountryBall]]
+        The countryballs to spawn and where.
+    concurrency: int
+        Maximum number of messages being sent at the same time.
+    """
+
+    def __init__(
+        self,
+        jobs: Iterable[tuple[discord.TextChannel, CountryBall]],
+        *,
+        concurrency: int = MAX_CONCURRENCY,
+    ):
+        self.jobs: dict[discord.TextChannel, list[CountryBall]] = defaultdict(list)
+        for channel, ball in jobs:
+            self.jobs[channel].append(ball)
+        self.total = sum(len(x) for x in self.jobs.values())
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+        self.spawned = 0
+        self.failed = 0
+        self.failed_channels: set[discord.TextChannel] = set()
+        self.started: float | None = None
+        self.finished: float | None = None
+
+    @classmethod
+    async def draw(
+        cls,
+        channels: Sequence[discord.TextChannel],
+        n: int,
+        countryball: Ball | None = None,
+        **kwargs,
+    ) -> "SpawnBatch":
+        """
+        Prepare `n` spawns in each channel, all of the given countryball, or drawn at random
+        according to rarities.
+        """
+        if countryball:
+            balls = [CountryBall(countryball) for _ in range(n * len(channels))]
+        else:
+            balls = await CountryBall.get_random_many(n * len(channels))
+        return cls(((channels[i % len(channels)], x) for i, x in enumerate(balls)), **kwargs)
+
+    @property
+    def skipped(self) -> int:
+        return self.total - self.spawned - self.failed if self.finished else 0
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self) -> float:
+        """
+        Number of countryballs spawned per second.
+        """
+        return self.spawned / self.elapsed if self.elapsed else 0
+
+    async def _spawn(self, channel: discord.TextChannel, ball: CountryBall):
+        try:
+            result = await ball.spawn(channel)
+        except Exception:
+            log.error(f"Failed to spawn {ball.name} in {channel}", exc_info=True)
+            result = False
+        finally:
+            self.semaphore.release()
+        if result:
+            self.spawned += 1
+        else:
+            self.failed += 1
+            self.failed_channels.add(channel)
+
+    async def _run_channel(self, channel: discord.TextChannel, balls: list[CountryBall]):
+        bucket = TokenBucket()
+        tasks: list[asyncio.Task] = []
+        for ball in balls:
+            await bucket.acquire()
+            await self.semaphore.acquire()
+            if channel in self.failed_channels:
+                self.semaphore.release()
+                break
+            tasks.append(asyncio.create_task(self._spawn(channel, ball)))
+        await asyncio.gather(*tasks)
+
+    async def run(
+        self,
+        progress: Callable[["SpawnBatch"], Awaitable[None]] | None = None,
+        interval: float = 5,
+    ):
+        """
+        Run the batch until all the countryballs are spawned or skipped.
+
+        Parameters
+        ----------
+        progress: Callable[[SpawnBatch], Awaitable[None]] | None
+            Coroutine function called every `interval` seconds while the batch is running.
+        interval: float
+            Interval in seconds between two progress calls.
+        """
+
+        async def progress_loop():
+            assert progress
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await progress(self)
+                except discord.HTTPException:
+                    log.warning("Failed to report spawn batch progress", exc_info=True)
+
+        self.started = time.monotonic()
+        task = asyncio.create_task(progress_loop()) if progress else None
+        try:
+            await asyncio.gather(
+                *(self._run_channel(channel, balls) for channel, balls in self.jobs.items())
+            )
+        finally:
+            if task:
+                task.cancel()
+            self.finished = time.monotonic()
+        log.info(
+            f"Spawn batch done: {self.spawned}/{self.total} spawned in {len(self.jobs)} "
+            f"channels, {self.failed} failed, {self.skipped} skipped, "
+            f"{self.elapsed:.1f}s ({self.rate:.2f}/s)"
+        )
@@ -1,27 +1,89 @@
+import asyncio
 import logging
+import time
+from pathlib import Path
 from typing import TYPE_CHECKING, Optional
 
 import discord
 from discord.ext import commands
-from tortoise.exceptions import DoesNotExist
 
-from ballsdex.core.models import GuildConfig
+from ballsdex.core.caches import guild_configs
+from ballsdex.packages.countryballs.scheduler import SpawnScheduler
+from ballsdex.packages.countryballs.snapshot import build_snapshot, read_snapshot, write_snapshot
 from ballsdex.packages.countryballs.spawn import SpawnManager
+from ballsdex.settings import settings
 
 if TYPE_CHECKING:
     from ballsdex.core.bot import BallsDexBot
 
 log = logging.getLogger("ballsdex.packages.countryballs")
 
+# interval in seconds between two evictions of idle spawn cooldowns
+EVICTION_INTERVAL = 300
+
 
 class CountryBallsSpawner(commands.Cog):
     def __init__(self, bot: "BallsDexBot"):
-        self.spawn_manager = SpawnManager()
+        self.spawn_manager = SpawnManager(idle_ttl=settings.spawn_idle_ttl * 60)
+        if settings.spawn_rate:
+            self.spawn_manager.scheduler = SpawnScheduler(
+                self.spawn_manager.spawn_countryball, settings.spawn_rate, settings.spawn_jitter
+            )
         self.bot = bot
+        self.snapshot_path = (
+            Path(settings.spawn_snapshot_path) if settings.spawn_snapshot_path else None
+        )
+        self.eviction_task: asyncio.Task | None = None
+        self.snapshot_task: asyncio.Task | None = None
+
+    async def cog_load(self):
+        if self.spawn_manager.scheduler:
+            self.spawn_manager.scheduler.start()
+        self.eviction_task = asyncio.create_task(self.eviction_loop())
+        if self.snapshot_path:
+            self.snapshot_task = asyncio.create_task(self.snapshot_loop())
+
+    async def cog_unload(self):
+        if self.spawn_manager.scheduler:
+            self.spawn_manager.scheduler.stop()
+        if self.eviction_task:
+            self.eviction_task.cancel()
+        if self.snapshot_task:
+            self.snapshot_task.cancel()
+        if self.snapshot_path:
+            try:
+                write_snapshot(
+                    self.snapshot_path, build_snapshot(self.spawn_manager.to_snapshot())
+                )
+            except OSError:
+                log.exception("Failed to save the spawn snapshot")
+            else:
+                log.info("Spawn snapshot saved.")
+
+    async def eviction_loop(self):
+        while True:
+            await asyncio.sleep(EVICTION_INTERVAL)
+            try:
+                compacted, dropped = self.spawn_manager.evict_idle(time.time())
+            except Exception:
+                log.exception("Failed to evict idle spawn cooldowns")
+                continue
+            if compacted or dropped:
+                log.debug(f"Spawn manager: {compacted} cooldowns compacted, {dropped} dropped.")
+
+    async def snapshot_loop(self):
+        assert self.snapshot_path
+        while True:
+            await asyncio.sleep(settings.spawn_snapshot_interval)
+            snapshot = build_snapshot(self.spawn_manager.to_snapshot())
+            try:
+                await asyncio.to_thread(write_snapshot, self.snapshot_path, snapshot)
+            except OSError:
+                log.exception("Failed to save the spawn snapshot")
 
     async def load_cache(self):
         i = 0
-        async for config in GuildConfig.all():
+        for config in guild_configs.values():
             if not config.enabled:
                 continue
             if not config.spawn_channel:
@@ -30,6 +92,12 @@ class CountryBallsSpawner(commands.Cog):
             i += 1
         grammar = "" if i == 1 else "s"
         log.info(f"Loaded {i} guild{grammar} in cache.")
+        self.bot.message_filter.load(self.spawn_manager.cache, self.bot.blacklist_guild)
+
+        if self.snapshot_path and (snapshot := read_snapshot(self.snapshot_path)):
+            restored = self.spawn_manager.restore_snapshot(snapshot)
+            age = time.time() - snapshot["saved_at"]
+            log.info(f"Restored {restored} spawn cooldowns from a snapshot made {age:.0f}s ago.")
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -57,14 +125,20 @@ class CountryBallsSpawner(commands.Cog):
             if channel:
                 self.spawn_manager.cache[guild.id] = channel.id
             else:
-                try:
-                    config = await GuildConfig.get(guild_id=guild.id)
-                except DoesNotExist:
+                config = guild_configs.get(guild.id)
+                if not config:
                     return
-                else:
-                    self.spawn_manager.cache[guild.id] = config.spawn_channel
+                self.spawn_manager.cache[guild.id] = config.spawn_channel
         else:
             if enabled is False:
                 del self.spawn_manager.cache[guild.id]
+                self.spawn_manager.discard(guild.id)
             elif channel:
                 self.spawn_manager.cache[guild.id] = channel.id
+        self.bot.message_filter.update_guild(guild.id, guild.id in self.spawn_manager.cache)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.spawn_manager.cache.pop(guild.id, None)
+        self.spawn_manager.discard(guild.id)
+        self.bot.message_filter.update_guild(guild.id, False)
@@ -8,10 +8,10 @@ from typing import TYPE_CHECKING, cast
 import discord
 from discord.ui import Button, Modal, TextInput, View
 from prometheus_client import Counter
-from tortoise.exceptions import DoesNotExist
 from tortoise.timezone import now as datetime_now
 
-from ballsdex.core.models import BallInstance, GuildConfig, Player, specials
+from ballsdex.core.caches import guild_configs, player_cache
+from ballsdex.core.models import BallInstance, specials
 from ballsdex.settings import settings
 
 if TYPE_CHECKING:
@@ -38,10 +38,7 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
         self.button = button
 
     async def on_error(self, interaction: discord.Interaction, error: Exception, /) -> None:
-        try:
-            config = await GuildConfig.get(guild_id=interaction.guild_id)
-        except DoesNotExist:
-            config = await GuildConfig.create(guild_id=interaction.guild_id, spawn_channel=None)
+        config = await guild_configs.get_or_create(interaction.guild_id)  # type: ignore
         log.exception("An error occured in countryball catching prompt", exc_info=error)
         if interaction.response.is_done():
             await interaction.followup.send(
@@ -55,21 +52,9 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
             )
 
     async def on_submit(self, interaction: discord.Interaction["BallsDexBot"]):
-        # TODO: use lock
-        await interaction.response.defer(thinking=True)
-
-        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
-        try:
-            config = await GuildConfig.get(guild_id=interaction.guild_id)
-        except DoesNotExist:
-            config = await GuildConfig.create(guild_id=interaction.guild_id, spawn_channel=None)
-
+        # answered from memory, losing a race must not cost any query
         if self.ball.catched:
-            await interaction.followup.send(
-                f"{interaction.user.mention} I was caught already!",
-                ephemeral=config.silent,
-                allowed_mentions=discord.AllowedMentions(users=player.can_be_mentioned),
-            )
+            await self.send_caught_already(interaction)
             return
 
         if self.ball.model.catch_names:
@@ -80,10 +65,18 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
             possible_names += tuple(x.lower() for x in self.ball.model.translations.split(";"))
 
         if self.name.value.lower().strip() in possible_names:
-            self.ball.catched = True
-            ball, has_caught_before = await self.catch_ball(
-                interaction.client, cast(discord.Member, interaction.user)
-            )
+            if not self.ball.claim():
+                await self.send_caught_already(interaction)
+                return
+            await interaction.response.defer(thinking=True)
+            try:
+                ball, has_caught_before = await self.catch_ball(
+                    interaction.client, cast(discord.Member, interaction.user)
+                )
+            except BaseException:
+                self.ball.release()
+                raise
+            player = ball.player
 
             special = ""
             if ball.shiny:
@@ -104,17 +97,34 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
             self.button.disabled = True
             await interaction.followup.edit_message(self.ball.message.id, view=self.button.view)
         else:
+            await interaction.response.defer(thinking=True)
+            player = await player_cache.get_or_create(interaction.user.id)
+            config = await guild_configs.get_or_create(interaction.guild_id)  # type: ignore
             await interaction.followup.send(
                 f"{interaction.user.mention} Wrong name! And you tried ``{self.name.value}``",
                 allowed_mentions=discord.AllowedMentions(users=player.can_be_mentioned),
                 ephemeral=config.silent,
             )
 
+    async def send_caught_already(self, interaction: discord.Interaction["BallsDexBot"]):
+        # the config and the player are read from the caches only, players that are not cached
+        # are not mentioned since their policy is unknown
+        config = guild_configs.get(interaction.guild_id)  # type: ignore
+        player = player_cache.get(interaction.user.id)
+        await interaction.response.send_message(
+            f"{interaction.user.mention} I was caught already!",
+            ephemeral=config.silent if config else False,
+            allowed_mentions=discord.AllowedMentions(
+                users=player.can_be_mentioned if player else False
+            ),
+        )
+
     async def catch_ball(
         self, bot: "BallsDexBot", user: discord.Member
     ) -> tuple[BallInstance, bool]:
-        player, created = await Player.get_or_create(discord_id=user.id)
-
+        """
+        Create the caught instance. The countryball must have been claimed first.
+        """
         # stat may vary by +/- 20% of base stat
         bonus_attack = random.randint(-settings.max_attack_bonus, settings.max_attack_bonus)
         bonus_health = random.randint(-settings.max_health_bonus, settings.max_health_bonus)
@@ -135,8 +145,8 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
             # None is added representing the common countryball
             special = random.choices(population=population + [None], weights=weights, k=1)[0]
 
-        is_new = not await BallInstance.filter(player=player, ball=self.ball.model).exists()
-        ball = await BallInstance.create(
+        player = await player_cache.get_or_create(user.id)
+        ball, is_new = await bot.catch_queue.create(
             ball=self.ball.model,
             player=player,
             shiny=shiny,
@@ -2,10 +2,12 @@ import logging
 import random
 import string
 from datetime import datetime
+from io import BytesIO
 
 import discord
 
-from ballsdex.core.models import Ball, balls
+from ballsdex.core.assets import asset_store
+from ballsdex.core.models import Ball, ball_sampler
 from ballsdex.packages.countryballs.components import CatchView
 from ballsdex.settings import settings
 
@@ -20,14 +22,36 @@ class CountryBall:
         self.catched = False
         self.time = datetime.now()
 
+    def claim(self) -> bool:
+        """
+        Reserve this countryball for a catch. Only the first caller gets `True`, the check and
+        the update happen without yielding to the event loop.
+        """
+        if self.catched:
+            return False
+        self.catched = True
+        return True
+
+    def release(self):
+        """
+        Make this countryball catchable again, after a failed catch.
+        """
+        self.catched = False
+
     @classmethod
     async def get_random(cls):
-        countryballs = list(filter(lambda m: m.enabled, balls.values()))
-        if not countryballs:
+        if not ball_sampler:
+            raise RuntimeError("No ball to spawn")
+        return cls(ball_sampler.draw())
+
+    @classmethod
+    async def get_random_many(cls, k: int):
+        """
+        Draw `k` countryballs at once, cheaper than calling `get_random` in a loop.
+        """
+        if not ball_sampler:
             raise RuntimeError("No ball to spawn")
-        rarities = [x.rarity for x in countryballs]
-        cb = random.choices(population=countryballs, weights=rarities, k=1)[0]
-        return cls(cb)
+        return [cls(x) for x in ball_sampler.draw_many(k)]
 
     async def spawn(self, channel: discord.TextChannel) -> bool:
         """
@@ -59,7 +83,9 @@ class CountryBall:
                 self.message = await channel.send(
                     f"A wild {settings.collectible_name} appeared!",
                     view=CatchView(self),
-                    file=discord.File(file_location, filename=file_name),
+                    file=discord.File(
+                        BytesIO(asset_store.get_bytes(file_location)), filename=file_name
+                    ),
                 )
                 return True
             else:
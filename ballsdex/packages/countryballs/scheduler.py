@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+import discord
+from prometheus_client import Gauge, Histogram
+
+log = logging.getLogger("ballsdex.packages.countryballs.scheduler")
+
+spawn_queue_size = Gauge("spawn_queue_size", "Spawns waiting in the scheduler queue")
+spawn_queue_lag = Histogram(
+    "spawn_queue_lag",
+    "Time between a guild reaching its spawn threshold and the spawn being released",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf")),
+)
+
+
+class SpawnScheduler:
+    """
+    Queue of spawns ready to happen, released at a bounded global rate.
+
+    Guilds reaching their spawn threshold are queued with a random delay of up to `jitter`
+    seconds, so that bursts of guilds reaching it together are spread out. Due spawns are then
+    released at most `rate` times per second, serving the shards in turn so that a busy shard
+    cannot delay the others.
+
+    The scheduler only decides when a spawn happens, the decision to spawn is still made by
+    the guild's `SpawnCooldown`.
+
+    Parameters
+    ----------
+    spawn: Callable[[discord.Guild], Awaitable[None]]
+        Coroutine function spawning a countryball in a guild.
+    rate: float
+        Maximum number of spawns released per second, across all shards.
+    jitter: float
+        Maximum random delay in seconds added before a spawn.
+    """
+
+    def __init__(
+        self,
+        spawn: Callable[[discord.Guild], Awaitable[None]],
+        rate: float = 10,
+        jitter: float = 5,
+    ):
+        self.spawn = spawn
+        self.rate = rate
+        self.jitter = jitter
+        # per shard heap of (release time, enqueue time, guild id, guild)
+        self.queues: defaultdict[int, list[tuple[float, float, int, discord.Guild]]] = defaultdict(
+            list
+        )
+        self.queued: set[int] = set()
+        self.shard_order: list[int] = []
+        self.next_shard = 0
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self.queued)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.release_loop())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.queued:
+            log.warning(f"Spawn scheduler stopped with {len(self.queued)} pending spawns.")
+
+    def enqueue(self, guild: discord.Guild) -> bool:
+        """
+        Queue a spawn for this guild. Returns `False` if one is already queued.
+        """
+        if guild.id in self.queued:
+            return False
+        now = time.monotonic()
+        shard_id = guild.shard_id
+        if shard_id not in self.queues:
+            self.shard_order.append(shard_id)
+        heapq.heappush(
+            self.queues[shard_id], (now + random.uniform(0, self.jitter), now, guild.id, guild)
+        )
+        self.queued.add(guild.id)
+        spawn_queue_size.set(len(self.queued))
+        self.wakeup.set()
+        return True
+
+    def _pop_due(self, now: float) -> tuple[float, discord.Guild] | float | None:
+        """
+        Pop the next due spawn, serving the shards round-robin. If nothing is due, return the
+        time of the earliest release instead, or `None` if the queue is empty.
+        """
+        earliest: float | None = None
+        for _ in range(len(self.shard_order)):
+            shard_id = self.shard_order[self.next_shard % len(self.shard_order)]
+            self.next_shard += 1
+            queue = self.queues[shard_id]
+            if queue[0][0] <= now:
+                _, enqueued, guild_id, guild = heapq.heappop(queue)
+                if not queue:
+                    del self.queues[shard_id]
+                    self.shard_order.remove(shard_id)
+                self.queued.discard(guild_id)
+                return enqueued, guild
+            if earliest is None or queue[0][0] < earliest:
+                earliest = queue[0][0]
+        return earliest
+
+    async def _spawn(self, guild: discord.Guild):
+        try:
+            await self.spawn(guild)
+        except Exception:
+            log.exception(f"Failed to spawn in guild {guild.id}")
+
+    async def release_loop(self):
+        interval = 1 / self.rate
+        while True:
+            now = time.monotonic()
+            result = self._pop_due(now)
+            if result is None or isinstance(result, float):
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self.wakeup.wait(), timeout=None if result is None else result - now
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            enqueued, guild = result
+            spawn_queue_lag.observe(now - enqueued)
+            spawn_queue_size.set(len(self.queued))
+            task = asyncio.create_task(self._spawn(guild))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+            await asyncio.sleep(interval)
@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+log = logging.getLogger("ballsdex.packages.countryballs.snapshot")
+
+SNAPSHOT_VERSION = 1
+
+
+def build_snapshot(state: dict) -> dict:
+    """
+    Wrap the state returned by `SpawnManager.to_snapshot` with the snapshot metadata.
+    """
+    return {"version": SNAPSHOT_VERSION, "saved_at": time.time(), **state}
+
+
+def write_snapshot(path: Path, snapshot: dict):
+    """
+    Write a snapshot to the disk. The file is replaced atomically, a crash while writing keeps
+    the previous snapshot intact.
+    """
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(snapshot, separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: Path) -> dict | None:
+    """
+    Read a snapshot from the disk, or return `None` if there is no usable snapshot.
+    """
+    try:
+        snapshot = json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        log.warning(f"Could not read the spawn snapshot at {path}, ignoring it", exc_info=True)
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        log.warning(f"Ignoring the spawn snapshot at {path}, made by another version")
+        return None
+    return snapshot
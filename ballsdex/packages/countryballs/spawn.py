@@ -1,23 +1,40 @@
-import asyncio
 import logging
 import random
+import sys
 from collections import deque, namedtuple
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
+from itertools import chain, zip_longest
 from typing import cast
 
 import discord
+from prometheus_client import Gauge
 
 from ballsdex.packages.countryballs.countryball import CountryBall
+from ballsdex.packages.countryballs.scheduler import SpawnScheduler
 
 log = logging.getLogger("ballsdex.packages.countryballs")
+spawn_manager_guilds = Gauge(
+    "spawn_manager_guilds", "Guilds tracked by the spawn manager", ["state"]
+)
+spawn_manager_memory = Gauge(
+    "spawn_manager_memory", "Estimated memory used by the spawn manager state in bytes"
+)
 
 SPAWN_CHANCE_RANGE = (40, 55)
 
-CachedMessage = namedtuple("CachedMessage", ["content", "author_id"])
+CachedMessage = namedtuple("CachedMessage", ["content_length", "author_id"])
+MESSAGE_CACHE_SIZE = 100
+# minimum interval in seconds between two messages increasing the counter
+INCREASE_INTERVAL = 10
 
+# compact form of an idle cooldown, without the message cache
+DormantCooldown = namedtuple("DormantCooldown", ["time", "amount", "chance"])
+# estimated size of a message cache entry: the tuple and its two ints
+_CACHED_MESSAGE_SIZE = sys.getsizeof(CachedMessage(0, 0)) + 2 * sys.getsizeof(2**60)
 
-@dataclass
+
+@dataclass(slots=True)
 class SpawnCooldown:
     """
     Represents the spawn internal system per guild. Contains the counters that will determine
@@ -32,71 +49,263 @@ class SpawnCooldown:
         point, a ball will be spawned next.
     chance: int
         The number `amount` has to reach for spawn. Determined randomly with `SPAWN_CHANCE_RANGE`
-    lock: asyncio.Lock
-        Used to ratelimit messages and ignore fast spam
+    next_increase: float
+        Timestamp before which messages do not increase `amount`, used to ratelimit messages
+        and ignore fast spam
     message_cache: ~collections.deque[CachedMessage]
         A list of recent messages used to reduce the spawn chance when too few different chatters
         are present. Limited to the 100 most recent messages in the guild.
+    author_counts: dict[int, int]
+        Number of messages of each author within `message_cache`, kept in sync with it.
+    short_messages: int
+        Number of messages shorter than 5 characters within `message_cache`.
+    last_message: float
+        Timestamp of the last message received, used to evict idle guilds.
     """
 
     time: datetime
     # initialize partially started, to reduce the dead time after starting the bot
     amount: float = field(default=SPAWN_CHANCE_RANGE[0] // 2)
     chance: int = field(default_factory=lambda: random.randint(*SPAWN_CHANCE_RANGE))
-    lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
-    message_cache: deque[CachedMessage] = field(default_factory=lambda: deque(maxlen=100))
+    next_increase: float = field(default=0, init=False)
+    message_cache: deque[CachedMessage] = field(
+        default_factory=lambda: deque(maxlen=MESSAGE_CACHE_SIZE)
+    )
+    author_counts: dict[int, int] = field(default_factory=dict, init=False)
+    short_messages: int = field(default=0, init=False)
+    last_message: float = field(default=0, init=False)
 
     def reset(self, time: datetime):
         self.amount = 1.0
         self.chance = random.randint(*SPAWN_CHANCE_RANGE)
-        try:
-            self.lock.release()
-        except RuntimeError:  # lock is not acquired
-            pass
+        self.next_increase = 0
         self.time = time
 
-    async def increase(self, message: discord.Message) -> bool:
-        # this is a deque, not a list
-        # its property is that, once the max length is reached (100 for us),
-        # the oldest element is removed, thus we only have the last 100 messages in memory
-        self.message_cache.append(
-            CachedMessage(content=message.content, author_id=message.author.id)
-        )
+    def on_cooldown(self, time: datetime) -> bool:
+        """
+        Whether a message sent at the given time would be ignored by the ratelimit.
+        """
+        return time.timestamp() < self.next_increase
+
+    def cache_message(self, content_length: int, author_id: int):
+        """
+        Add a message to the cache, evicting the oldest one if full, and update the counters.
+        """
+        if len(self.message_cache) == self.message_cache.maxlen:
+            evicted = self.message_cache.popleft()
+            count = self.author_counts[evicted.author_id] - 1
+            if count:
+                self.author_counts[evicted.author_id] = count
+            else:
+                del self.author_counts[evicted.author_id]
+            if evicted.content_length < 5:
+                self.short_messages -= 1
+        self.message_cache.append(CachedMessage(content_length, author_id))
+        self.author_counts[author_id] = self.author_counts.get(author_id, 0) + 1
+        if content_length < 5:
+            self.short_messages += 1
 
-        if self.lock.locked():
+    def increase(self, message: discord.Message) -> bool:
+        content_length = len(message.content)
+        self.cache_message(content_length, message.author.id)
+
+        timestamp = message.created_at.timestamp()
+        self.last_message = timestamp
+        if timestamp < self.next_increase:
             return False
+        self.next_increase = timestamp + INCREASE_INTERVAL
 
-        async with self.lock:
-            amount = 1
-            if message.guild.member_count < 5 or message.guild.member_count > 1000:  # type: ignore
-                amount /= 2
-            if len(message.content) < 5:
-                amount /= 2
-            if len(set(x.author_id for x in self.message_cache)) < 4 or (
-                len(list(filter(lambda x: x.author_id == message.author.id, self.message_cache)))
-                / self.message_cache.maxlen  # type: ignore
-                > 0.4
-            ):
-                amount /= 2
-            self.amount += amount
-            await asyncio.sleep(10)
+        amount = 1
+        if message.guild.member_count < 5 or message.guild.member_count > 1000:  # type: ignore
+            amount /= 2
+        if content_length < 5:
+            amount /= 2
+        if (
+            len(self.author_counts) < 4
+            or self.author_counts[message.author.id] / MESSAGE_CACHE_SIZE > 0.4
+        ):
+            amount /= 2
+        self.amount += amount
         return True
 
+    def memory_usage(self) -> int:
+        """
+        Estimated size in bytes of this object and its containers.
+        """
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.message_cache)
+            + len(self.message_cache) * _CACHED_MESSAGE_SIZE
+            + sys.getsizeof(self.author_counts)
+        )
+
+    def to_dormant(self) -> DormantCooldown:
+        return DormantCooldown(self.time, self.amount, self.chance)
+
+    @classmethod
+    def from_dormant(cls, dormant: DormantCooldown) -> "SpawnCooldown":
+        return cls(dormant.time, dormant.amount, dormant.chance)
+
+    def to_snapshot(self) -> list:
+        """
+        JSON-serializable state, with the message cache reduced to its counters.
+        """
+        return [
+            self.time.timestamp(),
+            self.amount,
+            self.chance,
+            self.last_message,
+            list(self.author_counts.items()),
+            self.short_messages,
+        ]
+
+    @classmethod
+    def from_snapshot(cls, data: list) -> "SpawnCooldown":
+        time, amount, chance, last_message, author_counts, short_messages = data
+        cooldown = cls(datetime.fromtimestamp(time, timezone.utc), amount, chance)
+        cooldown.last_message = last_message
+        # the order of the messages is not saved, interleave the authors so that evictions
+        # are spread between them
+        authors = ([author_id] * count for author_id, count in author_counts)
+        for i, author_id in enumerate(
+            x for x in chain.from_iterable(zip_longest(*authors)) if x is not None
+        ):
+            cooldown.cache_message(0 if i < short_messages else 5, author_id)
+        return cooldown
+
 
 @dataclass
 class SpawnManager:
+    """
+    Holds the spawn state of all guilds.
+
+    Attributes
+    ----------
+    cooldowns: dict[int, SpawnCooldown]
+        Cooldowns of the guilds that recently sent messages.
+    dormant: dict[int, DormantCooldown]
+        Compacted cooldowns of the guilds with spawning enabled that have been idle for more
+        than `idle_ttl` seconds. Restored on the next message.
+    cache: dict[int, int]
+        Spawn channel ID of each guild with spawning enabled.
+    idle_ttl: float
+        Seconds without messages after which a cooldown is evicted.
+    scheduler: SpawnScheduler | None
+        If set, spawns are queued there instead of happening immediately.
+    """
+
     cooldowns: dict[int, SpawnCooldown] = field(default_factory=dict)
+    dormant: dict[int, DormantCooldown] = field(default_factory=dict)
     cache: dict[int, int] = field(default_factory=dict)
+    idle_ttl: float = 3600
+    scheduler: SpawnScheduler | None = None
+
+    def get_cooldown(self, guild_id: int, time: datetime) -> SpawnCooldown:
+        """
+        Return the cooldown of a guild, restoring it if dormant or creating it if unknown.
+        """
+        cooldown = self.cooldowns.get(guild_id)
+        if cooldown:
+            return cooldown
+        if dormant := self.dormant.pop(guild_id, None):
+            cooldown = SpawnCooldown.from_dormant(dormant)
+        else:
+            cooldown = SpawnCooldown(time)
+        self.cooldowns[guild_id] = cooldown
+        return cooldown
+
+    def discard(self, guild_id: int):
+        """
+        Forget the spawn state of a guild, used when spawning is disabled.
+        """
+        self.cooldowns.pop(guild_id, None)
+        self.dormant.pop(guild_id, None)
+
+    def evict_idle(self, now: float) -> tuple[int, int]:
+        """
+        Compact the cooldowns idle for more than `idle_ttl`, and drop the state of the guilds
+        where spawning is no longer enabled.
+
+        Returns
+        -------
+        tuple[int, int]
+            The number of cooldowns made dormant, and the number of dropped cooldowns.
+        """
+        compacted = dropped = 0
+        for guild_id, cooldown in list(self.cooldowns.items()):
+            if guild_id not in self.cache:
+                del self.cooldowns[guild_id]
+                dropped += 1
+            elif now - cooldown.last_message > self.idle_ttl:
+                del self.cooldowns[guild_id]
+                self.dormant[guild_id] = cooldown.to_dormant()
+                compacted += 1
+        for guild_id in [x for x in self.dormant if x not in self.cache]:
+            del self.dormant[guild_id]
+            dropped += 1
+        self.update_metrics()
+        return compacted, dropped
+
+    def memory_usage(self) -> int:
+        """
+        Estimated size in bytes of the spawn state.
+        """
+        return (
+            sys.getsizeof(self.cooldowns)
+            + sum(x.memory_usage() for x in self.cooldowns.values())
+            + sys.getsizeof(self.dormant)
+            + len(self.dormant) * sys.getsizeof(DormantCooldown(None, 0.0, 0))
+            + sys.getsizeof(self.cache)
+        )
+
+    def to_snapshot(self) -> dict:
+        """
+        JSON-serializable state of all the cooldowns.
+        """
+        return {
+            "active": {str(k): v.to_snapshot() for k, v in self.cooldowns.items()},
+            "dormant": {
+                str(k): [v.time.timestamp(), v.amount, v.chance] for k, v in self.dormant.items()
+            },
+        }
+
+    def restore_snapshot(self, data: dict) -> int:
+        """
+        Restore the cooldowns from a snapshot, for the guilds where spawning is enabled.
+        Cooldowns already present are kept.
+
+        Returns
+        -------
+        int
+            The number of restored cooldowns.
+        """
+        restored = 0
+        for guild_id, value in data.get("active", {}).items():
+            guild_id = int(guild_id)
+            if guild_id in self.cache and guild_id not in self.cooldowns:
+                self.cooldowns[guild_id] = SpawnCooldown.from_snapshot(value)
+                restored += 1
+        for guild_id, (time, amount, chance) in data.get("dormant", {}).items():
+            guild_id = int(guild_id)
+            if guild_id in self.cache and guild_id not in self.cooldowns:
+                self.dormant[guild_id] = DormantCooldown(
+                    datetime.fromtimestamp(time, timezone.utc), amount, chance
+                )
+                restored += 1
+        self.update_metrics()
+        return restored
+
+    def update_metrics(self):
+        spawn_manager_guilds.labels(state="active").set(len(self.cooldowns))
+        spawn_manager_guilds.labels(state="dormant").set(len(self.dormant))
+        spawn_manager_memory.set(self.memory_usage())
 
     async def handle_message(self, message: discord.Message):
         guild = message.guild
         if not guild:
             return
 
-        cooldown = self.cooldowns.get(guild.id, None)
-        if not cooldown:
-            cooldown = SpawnCooldown(message.created_at)
-            self.cooldowns[guild.id] = cooldown
+        cooldown = self.get_cooldown(guild.id, message.created_at)
 
         delta = (message.created_at - cooldown.time).total_seconds()
         # change how the threshold varies according to the member count, while nuking farm servers
@@ -112,8 +321,8 @@ class SpawnManager:
             multiplier = 0.2
         chance = cooldown.chance - multiplier * (delta // 60)
 
-        # manager cannot be increased more than once per 5 seconds
-        if not await cooldown.increase(message):
+        # manager cannot be increased more than once per 10 seconds
+        if not cooldown.increase(message):
             return
 
         # normal increase, need to reach goal
@@ -127,9 +336,15 @@ class SpawnManager:
 
         # spawn countryball
         cooldown.reset(message.created_at)
-        await self.spawn_countryball(guild)
+        if self.scheduler:
+            self.scheduler.enqueue(guild)
+        else:
+            await self.spawn_countryball(guild)
 
     async def spawn_countryball(self, guild: discord.Guild):
+        if guild.id not in self.cache:
+            # spawning was disabled while the spawn was queued
+            return
         channel = guild.get_channel(self.cache[guild.id])
         if not channel:
             log.warning(f"Lost channel {self.cache[guild.id]} for guild {guild.name}.")
@@ -7,7 +7,7 @@ from typing import TYPE_CHECKING
 from collections import defaultdict
 
 from ballsdex.settings import settings
-from ballsdex.core.models import Player
+from ballsdex.core.caches import player_cache
 from ballsdex.core.utils.transformers import BallInstanceTransform
 from ballsdex.core.utils.buttons import ConfirmChoiceView
 from ballsdex.packages.gafusionv2.menu import FusionMenu, FusingUser
@@ -113,7 +113,7 @@ class Fusion(commands.GroupCog):
             )
             return
 
-        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         menu = FusionMenu(
             self, interaction, FusingUser(interaction.user, player), level,
         )
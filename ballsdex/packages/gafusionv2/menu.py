@@ -13,6 +13,7 @@ from tortoise.queryset import Prefetch
 from discord.ui import View, button, Button
 
 from ballsdex.settings import settings
+from ballsdex.core.inventory import owned_balls
 from ballsdex.core.models import Player, BallInstance, balls, Special
 from ballsdex.core.utils.transformers import BallInstanceTransform
 from ballsdex.packages.countryballs.countryball import CountryBall
@@ -409,6 +410,11 @@ class FusionMenu:
             health_bonus=random.randint(-40, 40),
             special= await Special.get(pk=int(settings.fusion_result_event[self.level])),
             )
+        await owned_balls.update(
+            self.fusionerUser.player.pk,
+            gained=[instance.ball_id],
+            lost=[x.ball_id for x in fuse_countryballs],
+        )
         
         await Level.add_xp(Level, self.fusionerUser.player, self.interaction, int(50 * (self.level +1)))
 
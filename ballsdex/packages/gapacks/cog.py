@@ -10,7 +10,8 @@ from discord.ext import commands
 from ballsdex.settings import settings
 from ballsdex.core.utils.paginator import FieldPageSource, Pages
 from ballsdex.settings import settings
-from ballsdex.core.models import Player, BallInstance, specials, balls 
+from ballsdex.core.caches import player_cache
+from ballsdex.core.models import BallInstance, specials, balls 
 from ballsdex.packages.countryballs.countryball import CountryBall
 
 from typing import TYPE_CHECKING
@@ -28,6 +29,11 @@ class gaPacks(commands.Cog):
     def __init__(self, bot: "BallsDexBot"):
         self.bot = bot
 
+    async def cog_load(self):
+        # vote webhooks are sent as bots, their channel must bypass the message filter
+        if vote_hook_channel := getattr(settings, "vote_hook_channel", None):
+            self.bot.message_filter.channels.add(vote_hook_channel)
+
     @app_commands.command()
     @app_commands.checks.cooldown(1, 10, key=lambda i: i.user.id)
     async def vote(self, interaction: discord.Interaction,):
@@ -54,8 +60,8 @@ class gaPacks(commands.Cog):
                 special = None
                 cob = await CountryBall.get_random()
                 UserID = re.sub("\D", "", data[1])
-                player, created = await Player.get_or_create(discord_id=UserID)
-                instance = await BallInstance.create(
+                player = await player_cache.get_or_create(int(UserID))
+                instance, _ = await self.bot.catch_queue.create(
                     ball=cob.model,
                     player=player,
                     shiny=(random.randint(1, 2048) == 1),
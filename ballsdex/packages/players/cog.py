@@ -9,6 +9,8 @@ from discord.utils import format_dt
 from tortoise.exceptions import DoesNotExist
 from tortoise.expressions import Q
 
+from ballsdex.core.caches import player_cache
+from ballsdex.core.inventory import owned_balls
 from ballsdex.core.models import (
     BallInstance,
     Block,
@@ -68,14 +70,15 @@ class Player(commands.GroupCog):
         policy: PrivacyPolicy
             The new privacy policy to choose.
         """
-        player, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         if policy == PrivacyPolicy.SAME_SERVER and not self.bot.intents.members:
             await interaction.response.send_message(
                 "I need the `members` intent to use this policy.", ephemeral=True
             )
             return
         player.privacy_policy = PrivacyPolicy(policy.value)
-        await player.save()
+        await player.save(update_fields=("privacy_policy",))
+        player_cache.update(player)
         await interaction.response.send_message(
             f"Your privacy policy has been set to **{policy.name}**.", ephemeral=True
         )
@@ -102,7 +105,7 @@ class Player(commands.GroupCog):
         policy: DonationPolicy
             The new policy for accepting donations
         """
-        player, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         player.donation_policy = DonationPolicy(policy.value)
         if policy.value == DonationPolicy.ALWAYS_ACCEPT:
             await interaction.response.send_message(
@@ -132,7 +135,9 @@ class Player(commands.GroupCog):
         else:
             await interaction.response.send_message("Invalid input!", ephemeral=True)
             return
-        await player.save()  # do not save if the input is invalid
+        # do not save if the input is invalid
+        await player.save(update_fields=("donation_policy",))
+        player_cache.update(player)
 
     @policy.command()
     @app_commands.choices(
@@ -150,9 +155,10 @@ class Player(commands.GroupCog):
         policy: MentionPolicy
             The new policy for mentions
         """
-        player, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         player.mention_policy = policy
-        await player.save()
+        await player.save(update_fields=("mention_policy",))
+        player_cache.update(player)
         await interaction.response.send_message(
             f"Your mention policy has been set to **{policy.name.lower()}**.", ephemeral=True
         )
@@ -173,9 +179,10 @@ class Player(commands.GroupCog):
         policy: FriendPolicy
             The new policy for friend requests.
         """
-        player, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         player.friend_policy = policy
-        await player.save()
+        await player.save(update_fields=("friend_policy",))
+        player_cache.update(player)
         await interaction.response.send_message(
             f"Your friend request policy has been set to **{policy.name.lower()}**.",
             ephemeral=True,
@@ -193,8 +200,10 @@ class Player(commands.GroupCog):
         await view.wait()
         if view.value is None or not view.value:
             return
-        player, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
         await player.delete()
+        player_cache.discard(interaction.user.id)
+        owned_balls.forget(player.pk)
 
     @friend.command(name="add")
     async def friend_add(self, interaction: discord.Interaction, user: discord.User):
@@ -206,8 +215,8 @@ class Player(commands.GroupCog):
         user: discord.User
             The user you want to add as a friend.
         """
-        player1, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
-        player2, _ = await PlayerModel.get_or_create(discord_id=user.id)
+        player1 = await player_cache.get_or_create(interaction.user.id)
+        player2 = await player_cache.get_or_create(user.id)
 
         if player1 == player2:
             await interaction.response.send_message(
@@ -285,8 +294,8 @@ class Player(commands.GroupCog):
         user: discord.User
             The user you want to remove as a friend.
         """
-        player1, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
-        player2, _ = await PlayerModel.get_or_create(discord_id=user.id)
+        player1 = await player_cache.get_or_create(interaction.user.id)
+        player2 = await player_cache.get_or_create(user.id)
 
         if player1 == player2:
             await interaction.response.send_message("You cannot remove yourself.", ephemeral=True)
@@ -315,7 +324,7 @@ class Player(commands.GroupCog):
         """
         View all your friends.
         """
-        player, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
 
         friendships = (
             await Friendship.filter(Q(player1=player) | Q(player2=player))
@@ -360,8 +369,8 @@ class Player(commands.GroupCog):
         user: discord.User
             The user you want to block.
         """
-        player1, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
-        player2, _ = await PlayerModel.get_or_create(discord_id=user.id)
+        player1 = await player_cache.get_or_create(interaction.user.id)
+        player2 = await player_cache.get_or_create(user.id)
 
         await interaction.response.defer(ephemeral=True, thinking=True)
 
@@ -408,8 +417,8 @@ class Player(commands.GroupCog):
         user: discord.User
             The user you want to unblock.
         """
-        player1, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
-        player2, _ = await PlayerModel.get_or_create(discord_id=user.id)
+        player1 = await player_cache.get_or_create(interaction.user.id)
+        player2 = await player_cache.get_or_create(user.id)
 
         if player1 == player2:
             await interaction.response.send_message("You cannot unblock yourself.", ephemeral=True)
@@ -434,7 +443,7 @@ class Player(commands.GroupCog):
         """
         View all the users you have blocked.
         """
-        player, _ = await PlayerModel.get_or_create(discord_id=interaction.user.id)
+        player = await player_cache.get_or_create(interaction.user.id)
 
         blocked_relations = (
             await Block.filter(player1=player).select_related("player1", "player2").all()
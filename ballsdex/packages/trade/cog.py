@@ -8,7 +8,8 @@ from discord.ext import commands
 from discord.utils import MISSING
 from tortoise.expressions import Q
 
-from ballsdex.core.models import BallInstance, Player
+from ballsdex.core.caches import player_cache
+from ballsdex.core.models import BallInstance
 from ballsdex.core.models import Trade as TradeModel
 from ballsdex.core.utils.buttons import ConfirmChoiceView
 from ballsdex.core.utils.paginator import Pages
@@ -116,8 +117,8 @@ class Trade(commands.GroupCog):
                 "You cannot trade with yourself.", ephemeral=True
             )
             return
-        player1, _ = await Player.get_or_create(discord_id=interaction.user.id)
-        player2, _ = await Player.get_or_create(discord_id=user.id)
+        player1 = await player_cache.get_or_create(interaction.user.id)
+        player2 = await player_cache.get_or_create(user.id)
         blocked = await player1.is_blocked(player2)
         if blocked:
             await interaction.response.send_message(
@@ -138,8 +139,8 @@ class Trade(commands.GroupCog):
             )
             return
 
-        player1, _ = await Player.get_or_create(discord_id=interaction.user.id)
-        player2, _ = await Player.get_or_create(discord_id=user.id)
+        player1 = await player_cache.get_or_create(interaction.user.id)
+        player2 = await player_cache.get_or_create(user.id)
         if player2.discord_id in self.bot.blacklist:
             await interaction.response.send_message(
                 "You cannot trade with a blacklisted user.", ephemeral=True
@@ -9,6 +9,7 @@ import discord
 from discord.ui import Button, View, button
 from discord.utils import format_dt, utcnow
 
+from ballsdex.core.inventory import owned_balls
 from ballsdex.core.models import BallInstance, Player, Trade, TradeObject
 from ballsdex.core.utils import menus
 from ballsdex.core.utils.buttons import ConfirmChoiceView
@@ -307,6 +308,10 @@ class TradeMenu:
         for countryball in valid_transferable_countryballs:
             await countryball.unlock()
             await countryball.save()
+        given1 = [x.ball_id for x in self.trader1.proposal]
+        given2 = [x.ball_id for x in self.trader2.proposal]
+        await owned_balls.update(self.trader1.player.pk, gained=given2, lost=given1)
+        await owned_balls.update(self.trader2.player.pk, gained=given1, lost=given2)
 
     async def confirm(self, trader: TradingUser) -> bool:
         """
@@ -56,6 +56,56 @@ class Settings:
         List of roles that have full access to the /admin command
     admin_role_ids: list[int]
         List of roles that have partial access to the /admin command (only blacklist and guilds)
+    card_cache_size: int
+        Maximum size in megabytes of the in-memory cache of rendered cards. With the base layer
+        and asset caches, this is the memory used by card rendering on top of the bot
+    card_cache_path: str | None
+        Folder where rendered cards are also cached on disk, disabled if `None`
+    card_base_layer_cache_size: int
+        Maximum size in megabytes of the cache of pre-rendered card layers, shared by all the
+        instances of a ball with the same background
+    asset_cache_size: int
+        Maximum size in megabytes of the wild cards and card layers kept in memory, images are
+        counted decoded
+    asset_preload: bool
+        Whether the assets are loaded in the cache on startup and on cache reloads, filling its
+        whole size. Otherwise they are loaded on demand
+    render_pool_type: str
+        Either "thread" or "process", the kind of workers used to render cards. Worker processes
+        split the base layer and asset cache sizes between them
+    render_pool_size: int | None
+        Number of workers rendering cards, defaults to the number of CPUs
+    render_pool_max_pending: int
+        Maximum number of cards rendered at the same time, other requests wait for a slot
+    card_format: str
+        Format of the uploaded cards, "png", "webp" or "jpeg"
+    card_quality: int
+        Quality of the lossy formats (webp and jpeg), between 1 and 100
+    card_optimize: bool
+        Make an extra pass to reduce the size of png and jpeg cards
+    card_compress_level: int
+        zlib compression level of png cards, between 0 and 9
+    card_scale: float
+        Resize factor applied to the cards before encoding, 1 keeps the original size
+    spawn_idle_ttl: int
+        Minutes without messages after which the spawn state of a guild is compacted, or
+        dropped if spawning is no longer enabled there
+    spawn_snapshot_path: str | None
+        File where the spawn state is periodically saved and restored from on startup,
+        disabled if `None`
+    spawn_snapshot_interval: int
+        Seconds between two saves of the spawn state
+    spawn_rate: float
+        Maximum number of spawns per second across all servers, spawns above this are queued.
+        0 disables the queue
+    spawn_jitter: float
+        Maximum random delay in seconds added to queued spawns
+    catch_flush_interval: int
+        Milliseconds between two writes of the caught countryballs, 0 (default) writes them
+        immediately. A positive delay confirms catches before storing them, they are lost on a
+        crash and cannot be found until written
+    catch_batch_size: int
+        Maximum number of caught countryballs written in a single query
     """
 
     bot_token: str = ""
@@ -89,6 +139,30 @@ class Settings:
     team_owners: bool = False
     co_owners: list[int] = field(default_factory=list)
 
+    # card rendering
+    card_cache_size: int = 64
+    card_cache_path: str | None = None
+    card_base_layer_cache_size: int = 128
+    asset_cache_size: int = 128
+    asset_preload: bool = False
+    render_pool_type: str = "thread"
+    render_pool_size: int | None = None
+    render_pool_max_pending: int = 64
+    card_format: str = "png"
+    card_quality: int = 90
+    card_optimize: bool = False
+    card_compress_level: int = 6
+    card_scale: float = 1
+
+    spawn_idle_ttl: int = 60
+    spawn_snapshot_path: str | None = "spawn-snapshot.json"
+    spawn_snapshot_interval: int = 60
+    spawn_rate: float = 10
+    spawn_jitter: float = 5
+
+    catch_flush_interval: int = 0
+    catch_batch_size: int = 500
+
     # metrics and prometheus
     prometheus_enabled: bool = False
     prometheus_host: str = "0.0.0.0"
@@ -134,6 +208,32 @@ def read_settings(path: "Path"):
     settings.max_favorites = content.get("max-favorites", 50)
     settings.max_attack_bonus = content.get("max-attack-bonus", 30)
     settings.max_health_bonus = content.get("max-health-bonus", 30)
+
+    cards = content.get("cards") or {}
+    settings.card_cache_size = cards.get("cache-size", 64)
+    settings.card_cache_path = cards.get("cache-path")
+    settings.card_base_layer_cache_size = cards.get("base-layer-cache-size", 128)
+    settings.asset_cache_size = cards.get("assets-cache-size", 128)
+    settings.asset_preload = cards.get("assets-preload", False)
+    settings.render_pool_type = cards.get("render-pool", "thread")
+    settings.render_pool_size = cards.get("render-pool-size")
+    settings.render_pool_max_pending = cards.get("render-pool-max-pending", 64)
+    settings.card_format = cards.get("format", "png")
+    settings.card_quality = cards.get("quality", 90)
+    settings.card_optimize = cards.get("optimize", False)
+    settings.card_compress_level = cards.get("compress-level", 6)
+    settings.card_scale = cards.get("scale", 1)
+
+    spawn_manager = content.get("spawn-manager") or {}
+    settings.spawn_idle_ttl = spawn_manager.get("idle-ttl", 60)
+    settings.spawn_snapshot_path = spawn_manager.get("snapshot-path", "spawn-snapshot.json")
+    settings.spawn_snapshot_interval = spawn_manager.get("snapshot-interval", 60)
+    settings.spawn_rate = spawn_manager.get("spawn-rate", 10)
+    settings.spawn_jitter = spawn_manager.get("spawn-jitter", 5)
+
+    catch_queue = content.get("catch-queue") or {}
+    settings.catch_flush_interval = catch_queue.get("flush-interval", 0)
+    settings.catch_batch_size = catch_queue.get("batch-size", 500)
     log.info("Settings loaded.")
 
 
@@ -224,6 +324,87 @@ prometheus:
   enabled: false
   host: "0.0.0.0"
   port: 15260
+
+# rendering of the collection cards
+cards:
+  # the three caches below add up to the memory used by card rendering, 320MB by default
+  # raise them on hosts with spare memory to render and spawn without reading the disk
+
+  # maximum size in megabytes of the in-memory cache of rendered cards
+  cache-size: 64
+
+  # folder where rendered cards are also cached on disk, leave empty to disable
+  cache-path:
+
+  # maximum size in megabytes of the pre-rendered layers shared by all instances of a ball
+  # one layer takes around 11MB
+  base-layer-cache-size: 128
+
+  # maximum size in megabytes of the wild cards and card images kept in memory
+  # images are counted decoded, a card background is about 11MB
+  assets-cache-size: 128
+
+  # load the assets on startup and on reloadcache until the cache above is full, to avoid
+  # reading files on the first spawns and renders. Otherwise they are loaded on demand
+  assets-preload: false
+
+  # kind of workers rendering the cards, "thread" or "process"
+  # processes avoid slowing down the bot under heavy load, but use more memory: each one has
+  # its own base layers and assets caches, the sizes above are divided between them
+  render-pool: thread
+
+  # number of workers rendering the cards, leave empty to use the number of CPUs
+  render-pool-size:
+
+  # maximum number of cards rendered at the same time, other requests wait for a slot
+  render-pool-max-pending: 64
+
+  # format of the uploaded cards: png, webp or jpeg
+  # webp and jpeg are several times smaller, at the cost of some quality
+  format: png
+
+  # quality of webp and jpeg cards, between 1 and 100
+  quality: 90
+
+  # make an extra pass to reduce the size of png and jpeg cards, slower to encode
+  optimize: false
+
+  # zlib compression level of png cards, between 0 (fastest) and 9 (smallest)
+  compress-level: 6
+
+  # resize factor applied to the cards before encoding, 1 keeps the original size
+  scale: 1
+
+# internal state of the spawn system
+spawn-manager:
+  # minutes without messages after which the spawn state of a server is compacted
+  # it is restored on the next message, or dropped if spawning was disabled there
+  idle-ttl: 60
+
+  # file where the spawn state is saved, to restore it after a restart
+  # leave empty to disable, every server will then start from scratch on restart
+  snapshot-path: spawn-snapshot.json
+
+  # seconds between two saves of the spawn state, it is also saved on shutdown
+  snapshot-interval: 60
+
+  # maximum number of spawns per second across all servers, the others are queued
+  # servers are served in turn per shard, set to 0 to spawn immediately instead
+  spawn-rate: 10
+
+  # maximum random delay in seconds added to spawns, spreads out bursts of spawns
+  spawn-jitter: 5
+
+# writes of the caught countryballs
+catch-queue:
+  # milliseconds between two writes, catches made meanwhile are inserted together
+  # 0 writes each catch before confirming it. With a delay, a catch is confirmed before
+  # being stored: a crash loses the pending catches, and until written they cannot be found
+  # by /balls info, trades or autocompletion. They are always written on a clean shutdown
+  flush-interval: 0
+
+  # maximum number of countryballs inserted by a single query
+  batch-size: 500
   """  # noqa: W291
     )
 
@@ -237,6 +418,9 @@ def update_settings(path: "Path"):
     add_max_attack = "max-attack-bonus" not in content
     add_max_health = "max-health-bonus" not in content
     add_plural_collectible = "plural-collectible-name" not in content
+    add_cards = "cards:" not in content
+    add_spawn_manager = "spawn-manager:" not in content
+    add_catch_queue = "catch-queue:" not in content
 
     for line in content.splitlines():
         if line.startswith("owners:"):
@@ -285,5 +469,95 @@ max-health-bonus: 20
 plural-collectible-name: countryballs
 """
 
-    if any((add_owners, add_config_ref)):
+    if add_cards:
+        content += """
+# rendering of the collection cards
+cards:
+  # the three caches below add up to the memory used by card rendering, 320MB by default
+  # raise them on hosts with spare memory to render and spawn without reading the disk
+
+  # maximum size in megabytes of the in-memory cache of rendered cards
+  cache-size: 64
+
+  # folder where rendered cards are also cached on disk, leave empty to disable
+  cache-path:
+
+  # maximum size in megabytes of the pre-rendered layers shared by all instances of a ball
+  # one layer takes around 11MB
+  base-layer-cache-size: 128
+
+  # maximum size in megabytes of the wild cards and card images kept in memory
+  # images are counted decoded, a card background is about 11MB
+  assets-cache-size: 128
+
+  # load the assets on startup and on reloadcache until the cache above is full, to avoid
+  # reading files on the first spawns and renders. Otherwise they are loaded on demand
+  assets-preload: false
+
+  # kind of workers rendering the cards, "thread" or "process"
+  # processes avoid slowing down the bot under heavy load, but use more memory: each one has
+  # its own base layers and assets caches, the sizes above are divided between them
+  render-pool: thread
+
+  # number of workers rendering the cards, leave empty to use the number of CPUs
+  render-pool-size:
+
+  # maximum number of cards rendered at the same time, other requests wait for a slot
+  render-pool-max-pending: 64
+
+  # format of the uploaded cards: png, webp or jpeg
+  # webp and jpeg are several times smaller, at the cost of some quality
+  format: png
+
+  # quality of webp and jpeg cards, between 1 and 100
+  quality: 90
+
+  # make an extra pass to reduce the size of png and jpeg cards, slower to encode
+  optimize: false
+
+  # zlib compression level of png cards, between 0 (fastest) and 9 (smallest)
+  compress-level: 6
+
+  # resize factor applied to the cards before encoding, 1 keeps the original size
+  scale: 1
+"""
+
+    if add_spawn_manager:
+        content += """
+# internal state of the spawn system
+spawn-manager:
+  # minutes without messages after which the spawn state of a server is compacted
+  # it is restored on the next message, or dropped if spawning was disabled there
+  idle-ttl: 60
+
+  # file where the spawn state is saved, to restore it after a restart
+  # leave empty to disable, every server will then start from scratch on restart
+  snapshot-path: spawn-snapshot.json
+
+  # seconds between two saves of the spawn state, it is also saved on shutdown
+  snapshot-interval: 60
+
+  # maximum number of spawns per second across all servers, the others are queued
+  # servers are served in turn per shard, set to 0 to spawn immediately instead
+  spawn-rate: 10
+
+  # maximum random delay in seconds added to spawns, spreads out bursts of spawns
+  spawn-jitter: 5
+"""
+
+    if add_catch_queue:
+        content += """
+# writes of the caught countryballs
+catch-queue:
+  # milliseconds between two writes, catches made meanwhile are inserted together
+  # 0 writes each catch before confirming it. With a delay, a catch is confirmed before
+  # being stored: a crash loses the pending catches, and until written they cannot be found
+  # by /balls info, trades or autocompletion. They are always written on a clean shutdown
+  flush-interval: 0
+
+  # maximum number of countryballs inserted by a single query
+  batch-size: 500
+"""
+
+    if any((add_owners, add_config_ref, add_cards, add_spawn_manager, add_catch_queue)):
         path.write_text(content)
@@ -0,0 +1,66 @@
+"""
+Compare the size and encoding time of a card in the supported output formats.
+
+Run from the root of the repository:
+
+    python -m benchmarks.card_encoding [--runs N]
+"""
+
+import argparse
+import time
+
+from ballsdex.core.image_generator.image_gen import (
+    SOURCES_PATH,
+    CardEncoding,
+    CardSpec,
+    encode_card,
+    get_base_layer,
+)
+
+ENCODINGS = {
+    "png (default)": CardEncoding(),
+    "png level 9": CardEncoding(compress_level=9),
+    "png optimize": CardEncoding(optimize=True),
+    "png 0.5x": CardEncoding(scale=0.5),
+    "webp q90": CardEncoding(format="webp", quality=90),
+    "webp q80": CardEncoding(format="webp", quality=80),
+    "webp q80 0.5x": CardEncoding(format="webp", quality=80, scale=0.5),
+    "jpeg q85": CardEncoding(format="jpeg", quality=85),
+    "jpeg q85 optimize": CardEncoding(format="jpeg", quality=85, optimize=True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Number of encodings per format")
+    args = parser.parse_args()
+
+    spec = CardSpec(
+        title="Benchmarkball",
+        capacity_name="Compression",
+        capacity_description="Shrinks every card it touches, without anybody noticing.",
+        credits="benchmarks",
+        background=str(SOURCES_PATH / "democracy.png"),
+        artwork=str(SOURCES_PATH / "fr_test.png"),
+        economy_icon=str(SOURCES_PATH / "capitalist.png"),
+        health=2500,
+        attack=1800,
+        shiny=False,
+    )
+    # the base layer is cached in production, keep it out of the measures
+    get_base_layer(spec)
+
+    print(f"{'encoding':<20} {'size':>10} {'time':>10}")
+    for name, encoding in ENCODINGS.items():
+        timings = []
+        for _ in range(args.runs):
+            t1 = time.perf_counter()
+            data = encode_card(spec, encoding)
+            timings.append(time.perf_counter() - t1)
+        timings.sort()
+        median = timings[len(timings) // 2]
+        print(f"{name:<20} {len(data) / 1024:>8.0f}KB {median * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
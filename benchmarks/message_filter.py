@@ -0,0 +1,119 @@
+"""
+Measure the cost of dispatching a message from a guild where nothing listens to it, with and
+without the message filter.
+
+Run from the root of the repository:
+
+    python -m benchmarks.message_filter [--messages N]
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+
+from ballsdex.core.message_filter import MessageFilter
+
+INTERESTING_GUILDS = 10_000
+BLACKLISTED_GUILDS = 1_000
+
+
+class SpawnListener(commands.Cog):
+    # same checks as CountryBallsSpawner.on_message
+    def __init__(self, bot: "Bot"):
+        self.bot = bot
+        self.cache = {i: i for i in range(INTERESTING_GUILDS)}
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot:
+            return
+        guild = message.guild
+        if not guild:
+            return
+        if guild.id not in self.cache:
+            return
+        if guild.id in self.bot.blacklist_guild:
+            return
+
+
+class ChannelListener(commands.Cog):
+    # same checks as gaPacks.on_message
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.channel.id == 1:
+            return
+
+
+class Bot(commands.Bot):
+    def __init__(self):
+        super().__init__("b.", intents=discord.Intents.none())
+        self.blacklist_guild = set(range(BLACKLISTED_GUILDS))
+
+
+class FilteredBot(Bot):
+    # same override as BallsDexBot.dispatch
+    def __init__(self):
+        super().__init__()
+        self.message_filter = MessageFilter()
+        self.message_filter.channels.add(1)
+        self.message_filter.load(range(INTERESTING_GUILDS), self.blacklist_guild)
+
+    def dispatch(self, event_name: str, /, *args, **kwargs):
+        if event_name == "message" and not self.message_filter.accepts(args[0], self.owner_ids):
+            return
+        super().dispatch(event_name, *args, **kwargs)
+
+
+def make_message(guild_id: int, bot: bool = False) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=0,
+        content="hello there, how is everyone doing today?",
+        guild=SimpleNamespace(id=guild_id),
+        channel=SimpleNamespace(id=guild_id * 10),
+        author=SimpleNamespace(id=42, bot=bot),
+        _state=None,
+    )
+
+
+async def measure(bot: Bot, message: SimpleNamespace, count: int) -> float:
+    current = asyncio.current_task()
+    t1 = time.perf_counter()
+    for i in range(count):
+        bot.dispatch("message", message)
+        # let the listener tasks run, as the gateway would between two events
+        if i % 100 == 0:
+            await asyncio.gather(*(x for x in asyncio.all_tasks() if x is not current))
+    await asyncio.gather(*(x for x in asyncio.all_tasks() if x is not current))
+    return (time.perf_counter() - t1) / count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20_000, help="Messages per case")
+    args = parser.parse_args()
+
+    cases = {
+        "uninteresting guild": make_message(INTERESTING_GUILDS + 1),
+        "uninteresting, bot": make_message(INTERESTING_GUILDS + 1, bot=True),
+        "blacklisted guild": make_message(BLACKLISTED_GUILDS - 1),
+        "spawn guild": make_message(INTERESTING_GUILDS - 1),
+    }
+    print(f"{'message':<22} {'unfiltered':>12} {'filtered':>12}")
+    for name, message in cases.items():
+        results = []
+        for cls in (Bot, FilteredBot):
+            bot = cls()
+            # normally done on login, binds the bot to the running loop
+            await bot._async_setup_hook()
+            await bot.add_cog(SpawnListener(bot))
+            await bot.add_cog(ChannelListener())
+            results.append(await measure(bot, message, args.messages))
+        print(f"{name:<22} {results[0] * 1e6:>10.2f}us {results[1] * 1e6:>10.2f}us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
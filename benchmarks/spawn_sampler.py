@@ -0,0 +1,56 @@
+"""
+Compare the weighted spawn sampler with the previous per-call implementation.
+
+Run from the root of the repository:
+
+    python -m benchmarks.spawn_sampler [--draws N]
+"""
+
+import argparse
+import random
+import timeit
+from types import SimpleNamespace
+
+from ballsdex.core.utils import sampler
+from ballsdex.core.utils.sampler import WeightedSampler
+
+
+def legacy_draw(balls: dict[int, SimpleNamespace]):
+    # previous implementation of CountryBall.get_random
+    countryballs = list(filter(lambda m: m.enabled, balls.values()))
+    rarities = [x.rarity for x in countryballs]
+    return random.choices(population=countryballs, weights=rarities, k=1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--draws", type=int, default=1000, help="Number of balls drawn per run")
+    args = parser.parse_args()
+    draws = args.draws
+
+    print(f"numpy: {'available' if sampler.numpy is not None else 'not installed'}")
+    print(f"{'balls':>6} {'method':<22} {'per draw':>12}")
+    for count in (1_000, 10_000):
+        balls = {
+            i: SimpleNamespace(enabled=random.random() > 0.1, rarity=random.uniform(0.1, 10))
+            for i in range(count)
+        }
+        enabled = [x for x in balls.values() if x.enabled]
+        weighted = WeightedSampler(enabled, (x.rarity for x in enabled))
+
+        cases = {
+            "legacy (loop)": lambda: [legacy_draw(balls) for _ in range(draws)],
+            "build sampler": lambda: WeightedSampler(enabled, (x.rarity for x in enabled)),
+            "sampler.draw (loop)": lambda: [weighted.draw() for _ in range(draws)],
+            f"sampler.draw_many({draws})": lambda: weighted.draw_many(draws),
+        }
+        for name, func in cases.items():
+            runs = 3
+            best = min(timeit.repeat(func, number=1, repeat=runs))
+            # building the sampler is done once, not per draw
+            per = best if name == "build sampler" else best / draws
+            print(f"{count:>6} {name:<22} {per * 1e6:>10.2f}us")
+
+
+if __name__ == "__main__":
+    main()
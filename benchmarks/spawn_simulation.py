@@ -0,0 +1,225 @@
+"""
+Replay message streams through the spawn algorithm, without Discord.
+
+Messages are either generated for several guild sizes, or read from a recorded JSON lines
+file, then fed to the real `SpawnManager.handle_message` in timestamp order. Time only
+advances through the message timestamps, so hours of traffic are replayed in seconds.
+
+Run from the root of the repository:
+
+    python -m benchmarks.spawn_simulation [--hours H] [--guilds N] [--seed S]
+    python -m benchmarks.spawn_simulation --input messages.jsonl
+
+Recorded files have one message per line, with the keys "timestamp" (seconds), "guild_id",
+"member_count", "author_id" and "content_length".
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Iterable, Iterator
+
+from ballsdex.packages.countryballs import spawn
+from ballsdex.packages.countryballs.spawn import SpawnCooldown, SpawnManager
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+@dataclass
+class GuildProfile:
+    name: str
+    member_count: int
+    # number of members that chat, and messages per hour across them
+    chatters: int
+    messages_per_hour: float
+
+
+PROFILES = [
+    GuildProfile("tiny (1-4)", 3, 2, 20),
+    GuildProfile("small (5-99)", 40, 8, 120),
+    GuildProfile("medium (100-999)", 400, 30, 600),
+    GuildProfile("large (1000+)", 5000, 150, 3000),
+]
+
+
+def member_bucket(member_count: int) -> str:
+    # same thresholds as SpawnManager.handle_message
+    if member_count < 5:
+        return "1-4"
+    elif member_count < 100:
+        return "5-99"
+    elif member_count < 1000:
+        return "100-999"
+    return "1000+"
+
+
+def make_message(
+    guilds: dict[int, SimpleNamespace],
+    timestamp: float,
+    guild_id: int,
+    member_count: int,
+    author_id: int,
+    content_length: int,
+) -> SimpleNamespace:
+    guild = guilds.get(guild_id)
+    if guild is None:
+        guild = guilds[guild_id] = SimpleNamespace(
+            id=guild_id, member_count=member_count, shard_id=0, name=str(guild_id)
+        )
+    return SimpleNamespace(
+        guild=guild,
+        author=SimpleNamespace(id=author_id, bot=False),
+        content="x" * content_length,
+        created_at=datetime.fromtimestamp(timestamp, timezone.utc),
+    )
+
+
+def generate_guild(
+    guilds: dict[int, SimpleNamespace], guild_id: int, profile: GuildProfile, hours: float
+) -> Iterator[SimpleNamespace]:
+    rng = random.Random(guild_id)
+    # a few members write most of the messages
+    authors = [guild_id * 10_000 + i for i in range(profile.chatters)]
+    weights = [1 / (i + 1) for i in range(profile.chatters)]
+    timestamp = START
+    end = START + hours * 3600
+    while True:
+        timestamp += rng.expovariate(profile.messages_per_hour / 3600)
+        if timestamp > end:
+            return
+        yield make_message(
+            guilds,
+            timestamp,
+            guild_id,
+            profile.member_count,
+            rng.choices(authors, weights)[0],
+            int(rng.lognormvariate(3, 1)),
+        )
+
+
+def read_recording(
+    guilds: dict[int, SimpleNamespace], lines: Iterable[str]
+) -> Iterator[SimpleNamespace]:
+    for line in lines:
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        yield make_message(
+            guilds,
+            data["timestamp"],
+            data["guild_id"],
+            data["member_count"],
+            data["author_id"],
+            data["content_length"],
+        )
+
+
+class SimulatedSpawnManager(SpawnManager):
+    """
+    Spawn manager recording the spawns instead of sending them.
+
+    The defaults of `SpawnCooldown` are bound to the range set when the module is imported,
+    new cooldowns are given `chance_range` explicitly instead.
+    """
+
+    def __init__(self, chance_range: tuple[int, int]):
+        super().__init__()
+        self.chance_range = chance_range
+        self.spawns: defaultdict[int, int] = defaultdict(int)
+
+    def get_cooldown(self, guild_id: int, time: datetime) -> SpawnCooldown:
+        if guild_id not in self.cooldowns and guild_id not in self.dormant:
+            self.cooldowns[guild_id] = SpawnCooldown(
+                time,
+                amount=self.chance_range[0] // 2,
+                chance=random.randint(*self.chance_range),
+            )
+        return super().get_cooldown(guild_id, time)
+
+    async def spawn_countryball(self, guild):
+        self.spawns[guild.id] += 1
+
+
+async def simulate(
+    messages: Iterable[SimpleNamespace],
+    guilds: dict[int, SimpleNamespace],
+    chance_range: tuple[int, int],
+):
+    manager = SimulatedSpawnManager(chance_range)
+    count = 0
+    first = last = None
+    # only the spawn code is measured, not the generation of the messages
+    cpu = 0.0
+    for message in messages:
+        if message.guild.id not in manager.cache:
+            manager.cache[message.guild.id] = 0
+        t1 = time.perf_counter()
+        await manager.handle_message(message)  # type: ignore
+        cpu += time.perf_counter() - t1
+        count += 1
+        last = message.created_at
+        if first is None:
+            first = last
+    hours = (last - first).total_seconds() / 3600 if first and last else 0
+    return manager, count, cpu, hours
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", type=argparse.FileType(), help="Recorded JSON lines stream")
+    parser.add_argument("--hours", type=float, default=24, help="Simulated duration")
+    parser.add_argument("--guilds", type=int, default=25, help="Generated guilds per profile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--chance-range",
+        type=int,
+        nargs=2,
+        metavar=("MIN", "MAX"),
+        help=f"Override SPAWN_CHANCE_RANGE (currently {spawn.SPAWN_CHANCE_RANGE})",
+    )
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    chance_range: tuple[int, int] = spawn.SPAWN_CHANCE_RANGE
+    if args.chance_range:
+        # also read by SpawnCooldown.reset after each spawn
+        chance_range = spawn.SPAWN_CHANCE_RANGE = tuple(args.chance_range)
+
+    guilds: dict[int, SimpleNamespace] = {}
+    if args.input:
+        messages = read_recording(guilds, args.input)
+    else:
+        streams = [
+            generate_guild(guilds, i * 1000 + j + 1, profile, args.hours)
+            for i, profile in enumerate(PROFILES)
+            for j in range(args.guilds)
+        ]
+        messages = heapq.merge(*streams, key=lambda x: x.created_at)
+
+    manager, count, cpu, hours = asyncio.run(simulate(messages, guilds, chance_range))
+    if not count:
+        print("No message to replay.")
+        return
+
+    buckets: defaultdict[str, list[int]] = defaultdict(list)
+    for guild in guilds.values():
+        buckets[member_bucket(guild.member_count)].append(manager.spawns[guild.id])
+
+    print(f"{count} messages over {hours:.1f}h in {len(guilds)} guilds")
+    print(f"handle_message: {cpu / count * 1e6:.2f}us per message ({cpu:.2f}s total)\n")
+    print(f"{'members':<10} {'guilds':>7} {'spawns':>7} {'spawns/h/guild':>15}")
+    for bucket in ("1-4", "5-99", "100-999", "1000+"):
+        if spawns := buckets.get(bucket):
+            per_hour = sum(spawns) / len(spawns) / hours if hours else 0
+            print(f"{bucket:<10} {len(spawns):>7} {sum(spawns):>7} {per_hour:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "playerownedballs" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "bitmap" BYTEA NOT NULL,
+    "player_id" INT NOT NULL UNIQUE REFERENCES "player" ("id") ON DELETE CASCADE
+);
+COMMENT ON COLUMN "playerownedballs"."bitmap" IS 'Bit N is set if the player owns the ball of ID N, little-endian';
+-- downgrade --
+DROP TABLE IF EXISTS "playerownedballs";
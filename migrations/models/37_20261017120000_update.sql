@@ -0,0 +1,6 @@
+-- upgrade --
+-- migrations run in a transaction, the index cannot be built CONCURRENTLY and writes to the
+-- table are blocked until it is built, run this during a maintenance window on large tables
+CREATE INDEX "idx_ballinstanc_player__0a7386" ON "ballinstance" ("player_id", "ball_id");
+-- downgrade --
+DROP INDEX IF EXISTS "idx_ballinstanc_player__0a7386";